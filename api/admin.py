@@ -1,11 +1,27 @@
 from django.contrib import admin
 
-from .models import Aliquot, Batch, Lab, Project, Sample, Workflow, WorkflowExecution
+from .models import (
+    Aliquot,
+    Batch,
+    Lab,
+    Project,
+    Sample,
+    SampleStatus,
+    SampleUploadReceipt,
+    SlackNotification,
+    UploadJob,
+    Workflow,
+    WorkflowExecution,
+)
 
 admin.site.register(Lab)
 admin.site.register(Project)
 admin.site.register(Sample)
+admin.site.register(SampleStatus)
 admin.site.register(Batch)
 admin.site.register(Aliquot)
 admin.site.register(Workflow)
 admin.site.register(WorkflowExecution)
+admin.site.register(UploadJob)
+admin.site.register(SampleUploadReceipt)
+admin.site.register(SlackNotification)
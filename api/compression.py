@@ -0,0 +1,79 @@
+"""
+Opt-in streaming compression of export responses. Content is compressed as it is
+produced, so an export is never held in memory to be compressed.
+"""
+import zlib
+
+from rest_framework.exceptions import ValidationError
+
+try:
+    import zstandard
+except ImportError:  # zstd is only offered when zstandard is installed
+    zstandard = None
+
+# Export formats compressed when the client accepts it; the others are already compressed files
+NEGOTIATED_FORMATS = {"csv"}
+
+
+def _gzip_compressor():
+    return zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+
+
+def _zstd_compressor():
+    return zstandard.ZstdCompressor().compressobj()
+
+
+# Maps a content coding to a function returning a compressor with compress() and flush(),
+# in the order they are preferred when the client accepts several
+COMPRESSORS = {"zstd": _zstd_compressor, "gzip": _gzip_compressor} if zstandard else {"gzip": _gzip_compressor}
+
+
+def get_export_encoding(request, export_format):
+    """
+    The content coding to compress an export with, or None to leave it uncompressed.
+    An explicit ?compress=gzip|zstd always applies, otherwise the coding is negotiated
+    from the Accept-Encoding header for the formats that compress well.
+    """
+    requested = request.query_params.get("compress")
+    if requested:
+        if requested not in COMPRESSORS:
+            raise ValidationError(
+                {"compress": f"Unsupported compression. Supported values are: {', '.join(sorted(COMPRESSORS))}."}
+            )
+        return requested
+
+    if export_format not in NEGOTIATED_FORMATS:
+        return None
+    accepted = _parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    return next((encoding for encoding in COMPRESSORS if encoding in accepted), None)
+
+
+def compress_response(response, encoding):
+    """
+    Compress a StreamingHttpResponse with ``encoding`` as its content is streamed.
+    """
+    response.streaming_content = _compress_sequence(response.streaming_content, COMPRESSORS[encoding]())
+    response["Content-Encoding"] = encoding
+    return response
+
+
+def _compress_sequence(sequence, compressor):
+    # the compressor buffers small pieces such as single CSV lines until it has a block to emit
+    for data in sequence:
+        if compressed := compressor.compress(data):
+            yield compressed
+    yield compressor.flush()
+
+
+def _parse_accept_encoding(header):
+    accepted = set()
+    for item in header.split(","):
+        encoding, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
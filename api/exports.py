@@ -0,0 +1,89 @@
+from itertools import islice
+
+import pyarrow as pa
+from django.db import models
+
+from .models import Sample
+
+# Columns of the Parquet and XLSX exports, as (column name, lookup on Sample). Related objects are
+# flattened to their names, and the latest workflow execution to its workflow and status.
+EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("sample_id", "sample_id"),
+    ("sample_name", "sample_name"),
+    ("tube_plate_label", "tube_plate_label"),
+    ("well", "well"),
+    ("submitting_lab", "submitting_lab__lab_name"),
+    ("submitter_project", "submitter_project"),
+    ("bmh_project", "bmh_project__project_name"),
+    ("sample_type", "sample_type"),
+    ("sample_volume_in_ul", "sample_volume_in_ul"),
+    ("requested_services", "requested_services"),
+    ("genus", "genus"),
+    ("species", "species"),
+    ("strain", "strain"),
+    ("isolate", "isolate"),
+    ("subspecies_subtype_lineage", "subspecies_subtype_lineage"),
+    ("approx_genome_size_in_bp", "approx_genome_size_in_bp"),
+    ("comments", "comments"),
+    ("culture_date", "culture_date"),
+    ("culture_conditions", "culture_conditions"),
+    ("dna_extraction_date", "dna_extraction_date"),
+    ("dna_extraction_method", "dna_extraction_method"),
+    ("qubit_concentration_in_ng_ul", "qubit_concentration_in_ng_ul"),
+    ("received", "received"),
+    ("latest_workflow", "status_summary__latest_workflow__workflow_name"),
+    ("latest_workflow_status", "status_summary__status"),
+    ("created", "created"),
+    ("modified", "modified"),
+]
+
+
+def get_export_schema():
+    """
+    Arrow schema of the export columns, typed after the model fields they are read from,
+    so dates, numbers and booleans keep their types in the exported file.
+    """
+    return pa.schema([pa.field(name, _get_arrow_type(_get_field(lookup))) for name, lookup in EXPORT_COLUMNS])
+
+
+def iter_export_batches(samples, batch_size):
+    """
+    Yield the export columns of ``samples`` as lists of at most ``batch_size`` row tuples,
+    read from the database a batch at a time. Choice fields are exported as their labels,
+    as in the CSV export.
+    """
+    fields = [_get_field(lookup) for _, lookup in EXPORT_COLUMNS]
+    labels = [dict(field.choices) if field.choices else None for field in fields]
+
+    rows = samples.order_by("id").values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+    iterator = rows.iterator(chunk_size=batch_size)
+    while batch := list(islice(iterator, batch_size)):
+        yield [
+            tuple(value if choices is None else choices.get(value, value) for value, choices in zip(row, labels))
+            for row in batch
+        ]
+
+
+def _get_field(lookup):
+    model = Sample
+    for name in lookup.split("__"):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+
+def _get_arrow_type(field):
+    if field.choices:
+        return pa.string()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    return pa.string()
@@ -0,0 +1,31 @@
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+
+from sample_database.jobs import claim_next_job, fail_upload_job, run_upload_job
+
+
+class Command(BaseCommand):
+    help = "Process queued sample sheet uploads, polling the database for new ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process the pending uploads and exit")
+        parser.add_argument("--interval", type=float, default=5, help="Seconds to wait between polls")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+
+            self.stdout.write(f"Processing upload {job.id}: {job.sample_sheet.name}")
+            try:
+                run_upload_job(job)
+            except Exception:
+                self.stderr.write(traceback.format_exc())
+                fail_upload_job(job, "Unexpected error while processing the upload.")
+            self.stdout.write(f"Upload {job.id} finished with status {job.status}")
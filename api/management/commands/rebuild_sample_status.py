@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Sample, refresh_sample_statuses
+
+# Number of samples whose status is recomputed and written together
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the status summary of every sample from its aliquots and workflow executions, "
+        "e.g. after they were changed with bulk or queryset updates that skip the signals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Number of samples rebuilt together; each batch is committed in its own transaction",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        # walk the samples by pk so every batch is a cheap range scan
+        rebuilt, last_pk = 0, 0
+        while True:
+            pks = list(Sample.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                refresh_sample_statuses(Sample.objects.filter(pk__range=(pks[0], pks[-1])))
+            rebuilt += len(pks)
+            last_pk = pks[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the status of {rebuilt} samples."))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sample_database.notifications import BATCH_SIZE, send_notifications
+
+
+class Command(BaseCommand):
+    help = "Send queued Slack notifications in batches, polling the database for new ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Send the notifications that are due and exit")
+        parser.add_argument("--interval", type=float, default=5, help="Seconds to wait between polls")
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE, help="Number of notifications combined into one message"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_notifications(batch_size=options["batch_size"])
+            if sent:
+                self.stdout.write(f"Sent {sent} notifications")
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
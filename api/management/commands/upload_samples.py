@@ -1,41 +1,159 @@
-import numpy as np
-import pandas as pd
-from django.core.management.base import BaseCommand
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-from api.models import SAMPLE_TYPE_CHOICES
-from api.serializers import SampleSerializer
+import django
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, transaction
+
+from api.services import save_samples, validate_samples
+from sample_database.jobs import _get_row_errors
+from sample_database.readers import CHUNK_SIZE, get_reader
+from sample_database.validation import DataCleanerValidator, duplicate_sample_name_error
 
 
 class Command(BaseCommand):
-    help = "Populate the Samples table from a spreadsheet"
+    help = "Populate the Samples table from a spreadsheet (.xlsx, .csv, .tsv or .parquet)"
 
     def add_arguments(self, parser):
         parser.add_argument("file_path", type=str, help="Path to the spreadsheet file")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Number of rows validated and saved together; each chunk is committed in its own transaction",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of processes used to validate chunks in parallel"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Validate the spreadsheet without saving anything")
 
     def handle(self, *args, **options):
         file_path = options["file_path"]
-        df = pd.read_excel(file_path, sheet_name="SSS-Template")
-
-        # convert sample type to value
-        sample_type_mapping = {value: key for key, value in SAMPLE_TYPE_CHOICES}
-        df["sample_type"] = df["sample_type"].map(sample_type_mapping)
-
-        # convert dates
-        df["culture_date"] = df["culture_date"].dt.date
-        df["dna_extraction_date"] = pd.to_datetime(df["culture_date"], errors="coerce")
-        df["dna_extraction_date"] = df["dna_extraction_date"].dt.date
-
-        # NaNs mess with JSON, so replace them
-        df = df.replace(np.nan, None)
-
-        data = df.to_dict(orient="records")
-        serializer = SampleSerializer(data=data, many=True)
-
-        for obj in serializer.initial_data:
-            individual_serializer = SampleSerializer(data=obj)
-            if individual_serializer.is_valid():
-                individual_instance = individual_serializer.save()
-                print(f"Sample {individual_instance.sample_name} uploaded successfully.")
-            else:
-                errors = individual_serializer.errors
-                print(f"Serializer errors: {errors}")
+        try:
+            reader = get_reader(file_path)
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1.")
+
+        started = time.monotonic()
+        summary = {"chunks": 0, "rows": 0, "samples": 0, "errors": []}
+        # spreadsheet row of each (lab, sample name) pair in earlier chunks, to catch duplicates that span chunks
+        seen_samples = {}
+
+        with open(file_path, "rb") as file:
+            chunks = reader(file, chunk_size=options["chunk_size"])
+            for n_rows, valid_rows, errors in self._validate_chunks(chunks, options["workers"]):
+                valid_rows, duplicate_errors = _remove_duplicates(valid_rows, seen_samples)
+                errors += duplicate_errors
+                if valid_rows and not options["dry_run"]:
+                    samples, save_errors = _save_chunk(valid_rows)
+                    errors += save_errors
+                else:
+                    samples = len(valid_rows)
+
+                summary["chunks"] += 1
+                summary["rows"] += n_rows
+                summary["samples"] += samples
+                summary["errors"] += errors
+
+        self._report(summary, options["dry_run"], time.monotonic() - started)
+
+    def _validate_chunks(self, chunks, workers):
+        if workers == 1:
+            yield from map(_validate_chunk, chunks)
+            return
+
+        # worker processes open their own database connections, so don't hand them ours
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            # keep a bounded number of chunks in flight so memory use doesn't grow with the file
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_validate_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _report(self, summary, dry_run, elapsed):
+        self.stdout.write(f"Read {summary['rows']} rows in {summary['chunks']} chunks in {elapsed:.1f}s.")
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"{summary['samples']} samples are valid. Dry run, nothing saved."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary['samples']} samples uploaded successfully."))
+
+        errors = summary["errors"]
+        if errors:
+            self.stderr.write(
+                self.style.ERROR(
+                    f"{len(errors)} error{'s' if len(errors) != 1 else ''}, rows with errors were not uploaded:"
+                )
+            )
+            for error in errors:
+                location = ", ".join(str(error[key]) for key in ("row", "field") if error[key] is not None)
+                self.stderr.write(f"  {location}: {error['message']}" if location else f"  {error['message']}")
+
+
+def _validate_chunk(df):
+    """
+    Clean and validate one chunk of rows. Returns the number of rows read, the validated
+    data of each valid row keyed by its spreadsheet row number, and the errors found.
+    Runs in a worker process when validating in parallel, so it only takes and returns
+    picklable values.
+    """
+    n_rows = len(df)
+    cleaner_validator = DataCleanerValidator(df)
+    try:
+        cleaner_validator.validate()
+    except ValidationError as e:
+        # only problems with the columns reject the whole chunk, report the rows that were dropped
+        first_row, last_row = df.index[0] + 2, df.index[-1] + 2
+        errors = [
+            {"row": None, "field": None, "message": f"Rows {first_row}-{last_row} were not uploaded: {message}"}
+            for message in e.messages
+        ]
+        return n_rows, [], errors
+    cleaner_validator.clean()
+    duplicate_errors = cleaner_validator.remove_duplicate_sample_names()
+    df = cleaner_validator.df
+
+    # report spreadsheet row numbers, accounting for the header row
+    row_numbers = [row + 2 for row in df.index]
+    records = df.to_dict(orient="records")
+    result = validate_samples(records)
+    if result.is_valid:
+        return n_rows, list(zip(row_numbers, result.validated_data)), duplicate_errors
+
+    errors = duplicate_errors + _get_row_errors(df, result.errors)
+    errors.sort(key=lambda error: error["row"])
+
+    # validate the rows without errors again on their own to get their data
+    valid = [(row, record) for row, record, row_errors in zip(row_numbers, records, result.errors) if not row_errors]
+    result = validate_samples([record for _, record in valid])
+    return n_rows, [(row, attrs) for (row, _), attrs in zip(valid, result.validated_data)], errors
+
+
+def _remove_duplicates(valid_rows, seen_samples):
+    # the first row with each name is kept, as it is within a chunk, so the rows saved don't depend on --chunk-size
+    unique_rows, errors = [], []
+    for row, attrs in valid_rows:
+        key = (attrs["submitting_lab"].pk, attrs["sample_name"])
+        if key in seen_samples:
+            errors.append(duplicate_sample_name_error(row, attrs["sample_name"], seen_samples[key]))
+        else:
+            seen_samples[key] = row
+            unique_rows.append((row, attrs))
+    return unique_rows, errors
+
+
+def _save_chunk(valid_rows):
+    try:
+        with transaction.atomic():
+            samples = save_samples([attrs for _, attrs in valid_rows])
+    except IntegrityError as e:
+        first_row, last_row = valid_rows[0][0], valid_rows[-1][0]
+        return 0, [{"row": None, "field": None, "message": f"Rows {first_row}-{last_row} could not be saved: {e}"}]
+    return len(samples), []
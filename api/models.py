@@ -1,8 +1,11 @@
+import hashlib
 from datetime import datetime
 
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connection, connections, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
 from simple_history.models import HistoricalRecords
 
 from bmh_sample_tracker.users.models import User
@@ -21,6 +24,29 @@ SAMPLE_TYPE_CHOICES = [
     ("OTHER", "Other - details in comments"),
 ]
 
+UPLOAD_JOB_STATUS_CHOICES = [
+    ("PENDING", "Pending"),
+    ("VALIDATING", "Validating"),
+    ("SAVING", "Saving"),
+    ("COMPLETE", "Complete"),
+    ("FAILED", "Failed"),
+]
+
+WORKFLOW_EXECUTION_STATUS_CHOICES = [
+    ("IN_PROGRESS", "In Progress"),
+    ("COMPLETE", "Complete"),
+    ("FAIL", "Fail"),
+]
+
+NOTIFICATION_STATUS_CHOICES = [
+    ("PENDING", "Pending"),
+    ("SENT", "Sent"),
+    ("FAILED", "Failed"),
+]
+
+# PostgreSQL sequence the numbers of new sample IDs are drawn from, see reserve_sample_ids
+SAMPLE_ID_SEQUENCE = "api_sample_id_number_seq"
+
 
 alphanumeric_underscore_hyphen_regex = r"^[a-zA-Z0-9_-]+$"
 alphanumeric_underscore_hyphen_validator = RegexValidator(
@@ -49,17 +75,86 @@ def min_length_validator(value):
         raise ValidationError(f"Text should have a minimum length of {MIN_CHAR} characters.")
 
 
+def reserve_sample_ids(count: int) -> list[str]:
+    """
+    Reserve ``count`` unique, increasing sample IDs in a single round trip.
+    On PostgreSQL the numbers are drawn from the ``SAMPLE_ID_SEQUENCE`` sequence, which
+    isn't transactional, so nothing stays locked while the caller's transaction is open.
+    They aren't necessarily contiguous there, as other uploads may draw from it at the same time.
+    Elsewhere they are claimed by atomically bumping the ``SampleIdCounter`` row, which
+    is seeded from the greatest sample pk the first time it is used so that IDs
+    continue on from the ones handed out by the old pk-based scheme.
+    Returns IDs formatted as LIMS-YYYY-XXXXXX.
+    """
+    if count < 1:
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [SAMPLE_ID_SEQUENCE, count])
+            numbers = [row[0] for row in cursor.fetchall()]
+        else:
+            counter_table = connection.ops.quote_name(SampleIdCounter._meta.db_table)
+            sample_table = connection.ops.quote_name(Sample._meta.db_table)
+            cursor.execute(
+                f"INSERT INTO {counter_table} (name, value) "
+                f"VALUES (%s, (SELECT COALESCE(MAX(id), 0) FROM {sample_table}) + %s) "
+                f"ON CONFLICT (name) DO UPDATE SET value = {counter_table}.value + %s "
+                f"RETURNING value",
+                [SampleIdCounter.SAMPLE_ID, count, count],
+            )
+            last_value = cursor.fetchone()[0]
+            numbers = range(last_value - count + 1, last_value + 1)
+
+    year = datetime.now().year
+    return [f"LIMS-{year}-{number:06}" for number in numbers]
+
+
+def create_sample_id_sequence(using="default"):
+    """
+    Create the PostgreSQL sequence sample IDs are drawn from, if it doesn't exist yet.
+    It starts after the greatest sample pk and the last number handed out by the
+    ``SampleIdCounter`` row, so IDs continue on from both of the earlier schemes.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    tables = connection.introspection.table_names()
+    if Sample._meta.db_table not in tables or SampleIdCounter._meta.db_table not in tables:
+        return
+
+    counter_table = connection.ops.quote_name(SampleIdCounter._meta.db_table)
+    sample_table = connection.ops.quote_name(Sample._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [SAMPLE_ID_SEQUENCE])
+        if cursor.fetchone()[0] is not None:
+            return
+        cursor.execute(f"CREATE SEQUENCE {connection.ops.quote_name(SAMPLE_ID_SEQUENCE)}")
+        cursor.execute(
+            f"SELECT setval(%s, GREATEST((SELECT COALESCE(MAX(id), 0) FROM {sample_table}), "
+            f"(SELECT COALESCE(MAX(value), 0) FROM {counter_table})) + 1, false)",
+            [SAMPLE_ID_SEQUENCE],
+        )
+
+
+def content_hash(chunks) -> str:
+    """
+    Return the SHA-256 hex digest of an upload, given as an iterable of byte strings.
+    Used to recognize a sample sheet that is submitted again without parsing it.
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
 def generate_sample_id() -> str:
     """
-    Method to generate a default sample ID for the Sample model.
-    Returns format as LIMS-YYYY-XXXXXX. This method will always
-    return the greatest sample pk value in the database + 1.
+    Method to generate the sample ID of a Sample when it is first saved.
+    Returns format as LIMS-YYYY-XXXXXX. Use ``reserve_sample_ids`` when
+    creating many samples at once.
     """
-    last_sample = Sample.objects.all().last()
-    id_ = 1
-    if last_sample is not None:
-        id_ = last_sample.id + 1
-    return f"LIMS-{datetime.now().year}-{id_:06}"
+    return reserve_sample_ids(1)[0]
 
 
 class TimeStampedModel(models.Model):
@@ -116,7 +211,7 @@ class Sample(TimeStampedModel):
     """
 
     # required fields
-    sample_id = models.CharField(max_length=SM_CHAR, default=generate_sample_id)
+    sample_id = models.CharField(max_length=SM_CHAR, unique=True, blank=True)  # assigned when first saved
     sample_name = models.CharField(
         max_length=SM_CHAR, validators=[min_length_validator, alphanumeric_underscore_hyphen_validator]
     )
@@ -149,9 +244,43 @@ class Sample(TimeStampedModel):
     def __str__(self):
         return f"{self.sample_id}: {self.sample_name}"
 
+    def save(self, *args, **kwargs):
+        # the ID is reserved here rather than as a field default, so only samples that are saved use one up
+        if not self.sample_id:
+            self.sample_id = generate_sample_id()
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Sample"
         verbose_name_plural = "Samples"
+        constraints = [
+            models.UniqueConstraint(fields=["submitting_lab", "sample_name"], name="unique_sample_name_per_lab"),
+        ]
+        indexes = [
+            # used to order samples by when they were created
+            models.Index(fields=["created", "id"], name="sample_created_id_idx"),
+            # used to find the samples changed since a point in time
+            models.Index(fields=["modified"], name="sample_modified_idx"),
+        ]
+
+
+class SampleIdCounter(models.Model):
+    """
+    Model to store the last sample ID number handed out, so IDs can be
+    reserved in blocks without racing concurrent uploads
+    """
+
+    SAMPLE_ID = "sample_id"
+
+    name = models.CharField(max_length=SM_CHAR, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    class Meta:
+        verbose_name = "Sample ID Counter"
+        verbose_name_plural = "Sample ID Counters"
 
 
 class Batch(TimeStampedModel):
@@ -217,16 +346,7 @@ class WorkflowExecution(TimeStampedModel):
     aliquot = models.ForeignKey(Aliquot, on_delete=models.CASCADE)
     workflow = models.ForeignKey(Workflow, on_delete=models.CASCADE)
 
-    status = models.CharField(
-        max_length=SM_CHAR,
-        choices=(
-            ("IN_PROGRESS", "In Progress"),
-            ("COMPLETE", "Complete"),
-            ("FAIL", "Fail"),
-        ),
-        null=True,
-        blank=True,
-    )
+    status = models.CharField(max_length=SM_CHAR, choices=WORKFLOW_EXECUTION_STATUS_CHOICES, null=True, blank=True)
 
     history = HistoricalRecords()
 
@@ -236,3 +356,156 @@ class WorkflowExecution(TimeStampedModel):
     class Meta:
         verbose_name = "Workflow Execution"
         verbose_name_plural = "Workflow Executions"
+        indexes = [
+            # used to find the latest execution of each sample's aliquots
+            models.Index(fields=["aliquot", "-modified"], name="execution_aliquot_modified_idx"),
+        ]
+
+
+class SampleStatus(models.Model):
+    """
+    Model to store a summary of where a sample is in the lab: its latest workflow execution,
+    its aliquot count and when one of them last changed. Kept up to date by the signal
+    receivers in api.signals, and rebuilt in full by the rebuild_sample_status command.
+    """
+
+    sample = models.OneToOneField(Sample, on_delete=models.CASCADE, primary_key=True, related_name="status_summary")
+    latest_workflow_execution = models.ForeignKey(
+        WorkflowExecution, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    latest_workflow = models.ForeignKey(Workflow, on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
+    status = models.CharField(max_length=SM_CHAR, choices=WORKFLOW_EXECUTION_STATUS_CHOICES, null=True, blank=True)
+    aliquot_count = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.sample_id}: {self.status}"
+
+    class Meta:
+        verbose_name = "Sample Status"
+        verbose_name_plural = "Sample Statuses"
+
+
+class UploadJob(TimeStampedModel):
+    """
+    Model to store a sample sheet upload that is processed in the background,
+    along with its progress and the per-row errors found in it
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    submitting_lab = models.ForeignKey(Lab, on_delete=models.CASCADE)
+    bmh_project = models.ForeignKey(Project, on_delete=models.CASCADE, blank=True, null=True)
+    submitter_project = models.CharField(max_length=LG_CHAR, blank=True, null=True)
+    sample_sheet = models.FileField(upload_to="sample_uploads/%Y/%m/")
+    dry_run = models.BooleanField(default=False)  # validate the sheet without saving any samples
+    content_hash = models.CharField(max_length=64, blank=True, default="")  # SHA-256 of the sample sheet
+
+    status = models.CharField(max_length=SM_CHAR, choices=UPLOAD_JOB_STATUS_CHOICES, default="PENDING")
+    rows_processed = models.PositiveIntegerField(default=0)
+    samples_created = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"{self.id}: {self.sample_sheet.name} ({self.status})"
+
+    class Meta:
+        verbose_name = "Upload Job"
+        verbose_name_plural = "Upload Jobs"
+        indexes = [
+            models.Index(fields=["status", "created"], name="uploadjob_status_created_idx"),
+            models.Index(fields=["submitting_lab", "content_hash"], name="uploadjob_lab_hash_idx"),
+        ]
+
+
+class SampleUploadReceipt(TimeStampedModel):
+    """
+    Model to store the response to an accepted upload through the sample upload API,
+    keyed by lab and the hash of the uploaded data, so that a resubmission of the same
+    data can be answered with the original response
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    submitting_lab = models.ForeignKey(Lab, on_delete=models.CASCADE)
+    content_hash = models.CharField(max_length=64)
+    response = models.JSONField()
+
+    def __str__(self):
+        return f"{self.submitting_lab}: {self.content_hash}"
+
+    class Meta:
+        verbose_name = "Sample Upload Receipt"
+        verbose_name_plural = "Sample Upload Receipts"
+        constraints = [
+            models.UniqueConstraint(fields=["submitting_lab", "content_hash"], name="unique_upload_per_lab"),
+        ]
+
+
+class SlackNotification(TimeStampedModel):
+    """
+    Model to store a Slack message waiting to be sent. Messages are written here
+    instead of being posted straight away, and sent in batches by the
+    send_slack_notifications command so that no request waits on Slack
+    """
+
+    message = models.TextField()
+    status = models.CharField(max_length=SM_CHAR, choices=NOTIFICATION_STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return f"{self.id}: {self.message} ({self.status})"
+
+    class Meta:
+        verbose_name = "Slack Notification"
+        verbose_name_plural = "Slack Notifications"
+        indexes = [
+            models.Index(fields=["status", "next_attempt"], name="slacknotification_due_idx"),
+        ]
+
+
+def latest_workflow_execution_id():
+    """
+    Subquery for the id of a sample's most recently modified workflow execution across
+    all of its aliquots, for annotating a Sample queryset.
+    """
+    executions = WorkflowExecution.objects.filter(aliquot__sample=OuterRef("pk")).order_by("-modified", "-id")
+    return Subquery(executions.values("id")[:1])
+
+
+def refresh_sample_statuses(samples):
+    """
+    Recompute the SampleStatus of every sample in the ``samples`` queryset from its aliquots
+    and workflow executions, and write them with a single upsert.
+    """
+    summaries = samples.order_by().annotate(
+        latest_execution_id=latest_workflow_execution_id(),
+        n_aliquots=Count("aliquot"),
+        last_aliquot_activity=Max("aliquot__modified"),
+    )
+    summaries = list(summaries.values_list("id", "latest_execution_id", "n_aliquots", "last_aliquot_activity"))
+    executions = WorkflowExecution.objects.only("workflow_id", "status", "modified").in_bulk(
+        {execution_id for _, execution_id, _, _ in summaries} - {None}
+    )
+
+    statuses = []
+    for sample_id, execution_id, aliquot_count, last_aliquot_activity in summaries:
+        execution = executions.get(execution_id)
+        activity = [last_aliquot_activity, execution.modified if execution else None]
+        statuses.append(
+            SampleStatus(
+                sample_id=sample_id,
+                latest_workflow_execution=execution,
+                latest_workflow_id=execution.workflow_id if execution else None,
+                status=execution.status if execution else None,
+                aliquot_count=aliquot_count,
+                last_activity=max((t for t in activity if t is not None), default=None),
+            )
+        )
+    SampleStatus.objects.bulk_create(
+        statuses,
+        update_conflicts=True,
+        unique_fields=["sample"],
+        update_fields=["latest_workflow_execution", "latest_workflow", "status", "aliquot_count", "last_activity"],
+    )
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class SampleCursorPagination(CursorPagination):
+    """
+    Pages through samples by id, which is the order they were created in. Each page is found
+    by seeking past the last id of the previous page on the primary key rather than with an
+    OFFSET, so a page deep into the table costs the same as the first one. The cursor only
+    seeks on the first ordering field, so that field has to be unique.
+    """
+
+    ordering = "id"
+    page_size = 500
+    page_size_query_param = "page_size"
+    max_page_size = 5000
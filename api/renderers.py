@@ -1,6 +1,17 @@
-from rest_framework import renderers
 import csv
 import io
+from datetime import datetime
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.writer.excel import ExcelWriter
+from rest_framework import renderers
+
 
 class CSVRenderer(renderers.BaseRenderer):
     media_type = 'text/csv'
@@ -9,6 +20,8 @@ class CSVRenderer(renderers.BaseRenderer):
     def render(self, data, accepted_media_type=None, renderer_context=None):
         if not isinstance(data, list):
             data = [data]
+        if not data:
+            return ""
 
         csv_buffer = io.StringIO()
         writer = csv.DictWriter(csv_buffer, fieldnames=data[0].keys())
@@ -16,4 +29,123 @@ class CSVRenderer(renderers.BaseRenderer):
         for row in data:
             writer.writerow(row)
 
-        return csv_buffer.getvalue()
\ No newline at end of file
+        return csv_buffer.getvalue()
+
+
+class _LineBuffer:
+    # hands each line written by the csv module straight back instead of storing it
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, fieldnames):
+    """
+    Yield a CSV header and then one CSV line per row, as rows are produced, so an export
+    can be streamed with a StreamingHttpResponse without building it in memory first.
+    """
+    writer = csv.DictWriter(_LineBuffer(), fieldnames=fieldnames)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class ParquetRenderer(renderers.BaseRenderer):
+    """
+    Negotiates the Parquet export. The samples are streamed by SampleAPIView with
+    ``iter_parquet`` rather than rendered here, and errors are sent as JSON.
+    """
+
+    media_type = "application/vnd.apache.parquet"
+    format = "parquet"
+    charset = None
+    render_style = "binary"
+
+
+class XLSXRenderer(renderers.BaseRenderer):
+    """
+    Negotiates the XLSX export. The samples are streamed by SampleAPIView with
+    ``iter_xlsx`` rather than rendered here, and errors are sent as JSON.
+    """
+
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    format = "xlsx"
+    charset = None
+    render_style = "binary"
+
+
+class _ChunkBuffer:
+    # collects what the parquet or zip writer writes until it is taken out with drain()
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, value):
+        self.chunks.append(bytes(value))
+        return len(value)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(batches, schema):
+    """
+    Yield a Parquet file in pieces, writing a row group for each batch of rows as batches are
+    produced, so an export can be streamed without building it in memory first. ``batches``
+    is an iterable of lists of row tuples in the order of the fields of ``schema``.
+    """
+    buffer = _ChunkBuffer()
+    with pq.ParquetWriter(buffer, schema) as writer:
+        for batch in batches:
+            columns = zip(*batch)
+            arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+class _StreamedSheetExcelWriter(ExcelWriter):
+    # writes the parts of a workbook around a worksheet that was already streamed into the archive
+    def write_worksheet(self, ws):
+        ws._drawing = SpreadsheetDrawing()
+        ws._rels = ws._writer._rels
+        self.manifest.append(ws)
+
+
+def iter_xlsx(batches, fieldnames):
+    """
+    Yield an XLSX file with a header row and then the rows of each batch, as batches are
+    produced. The rows of openpyxl's write-only worksheet are written straight into the
+    zipped sheet instead of to a temporary file, and what has been compressed so far is
+    yielded after each batch. The rest of the workbook is written once the rows are done.
+    """
+    buffer = _ChunkBuffer()
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet._id = 1
+    # the buffer can't seek, so the archive is written with data descriptors after each member
+    with ZipFile(buffer, "w", ZIP_DEFLATED, allowZip64=True) as archive:
+        with archive.open(worksheet.path[1:], "w", force_zip64=True) as sheet_file:
+            worksheet._writer = WorksheetWriter(worksheet, out=sheet_file)
+            worksheet._writer.write_top()
+            worksheet.append(fieldnames)
+            for batch in batches:
+                for row in batch:
+                    worksheet.append([_make_naive(value) for value in row])
+                # the compressor holds on to small batches, there's nothing to send until it lets go of them
+                if data := buffer.drain():
+                    yield data
+            worksheet.close()
+        _StreamedSheetExcelWriter(workbook, archive).write_data()
+    yield buffer.drain()
+
+
+def _make_naive(value):
+    # Excel has no time zones, so datetimes are written in the local time zone
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
@@ -0,0 +1,61 @@
+"""
+The labs whose data a user can see. Users are members of a lab through the auth group
+named after it, so groups are matched to labs by name. A user's lab ids are cached, and
+dropped from the cache by the receivers in api.signals when memberships or names change.
+"""
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from .models import Lab
+
+# Seconds a user's lab ids are kept in the cache
+LAB_SCOPE_TIMEOUT = 60 * 60
+
+# Part of every user's cache key, replacing it drops the lab ids of every user at once
+LAB_SCOPE_VERSION_KEY = "lab-scope:version"
+
+
+def sees_all_labs(user):
+    return user.is_superuser or user.is_staff
+
+
+def get_user_lab_ids(user):
+    """
+    Ids of the labs the user is a member of. Staff are shown every lab by the views,
+    but this only returns the labs they are a member of.
+    """
+    key = _cache_key(user.pk)
+    lab_ids = cache.get(key)
+    if lab_ids is None:
+        group_names = user.groups.values("name")
+        lab_ids = list(Lab.objects.filter(lab_name__in=group_names).values_list("id", flat=True))
+        cache.set(key, lab_ids, LAB_SCOPE_TIMEOUT)
+    return lab_ids
+
+
+def scope_to_user_labs(queryset, user, lab_field="submitting_lab"):
+    """
+    Restrict ``queryset`` to the rows whose ``lab_field`` is one of the user's labs.
+    Staff see every row.
+    """
+    if sees_all_labs(user):
+        return queryset
+    return queryset.filter(**{f"{lab_field}__in": get_user_lab_ids(user)})
+
+
+def clear_user_lab_ids(user_ids):
+    version = _get_version()
+    cache.delete_many([_cache_key(user_id, version) for user_id in user_ids])
+
+
+def clear_all_lab_ids():
+    cache.delete(LAB_SCOPE_VERSION_KEY)
+
+
+def _get_version():
+    return cache.get_or_set(LAB_SCOPE_VERSION_KEY, lambda: uuid4().hex, timeout=None)
+
+
+def _cache_key(user_id, version=None):
+    return f"lab-scope:{version or _get_version()}:{user_id}"
@@ -1,5 +1,6 @@
 from django.core.exceptions import ValidationError
 from rest_framework import serializers
+from simple_history.utils import bulk_create_with_history
 
 from .models import (
     LG_CHAR,
@@ -9,12 +10,17 @@ from .models import (
     Lab,
     Project,
     Sample,
+    SampleStatus,
+    UploadJob,
     Workflow,
     WorkflowExecution,
-    generate_sample_id,
+    reserve_sample_ids,
     well_validator,
 )
 
+# Number of rows written per INSERT when bulk creating samples
+BULK_CREATE_BATCH_SIZE = 500
+
 
 class LabSerializer(serializers.ModelSerializer):
     class Meta:
@@ -65,11 +71,74 @@ class SampleTypeField(serializers.Field):
         return result
 
 
+class CachedSlugRelatedField(serializers.SlugRelatedField):
+    """
+    SlugRelatedField that resolves each distinct slug once per serializer context, so a
+    batch of rows that all name the same lab or project only queries the database once.
+    Pass the same context to several serializers to share the cache between them.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (str, int, float)):
+            return super().to_internal_value(data)
+
+        cache = self.context.setdefault("related_objects", {})
+        key = (self.queryset.model, self.slug_field, data)
+        if key not in cache:
+            try:
+                cache[key] = super().to_internal_value(data)
+            except serializers.ValidationError as e:
+                cache[key] = e
+        if isinstance(cache[key], serializers.ValidationError):
+            raise serializers.ValidationError(cache[key].detail)
+        return cache[key]
+
+
+class SampleListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # look up every (lab, sample name) pair in the upload with one query rather than one per row
+        if isinstance(data, list):
+            self.context["existing_samples"] = self._get_existing_samples(data)
+            # kept when the context is shared between chunks, to catch duplicates across them
+            self.context.setdefault("uploaded_samples", set())
+        return super().to_internal_value(data)
+
+    def _get_existing_samples(self, data):
+        rows = [row for row in data if isinstance(row, dict)]
+        sample_names = {str(row["sample_name"]).strip() for row in rows if row.get("sample_name") is not None}
+        lab_names = {row["submitting_lab"] for row in rows if row.get("submitting_lab") is not None}
+        if not sample_names or not lab_names:
+            return set()
+        return set(
+            Sample.objects.filter(sample_name__in=sample_names, submitting_lab__lab_name__in=lab_names).values_list(
+                "submitting_lab_id", "sample_name"
+            )
+        )
+
+    def create(self, validated_data):
+        # reserve IDs for the whole upload up front instead of one lookup per sample
+        sample_ids = reserve_sample_ids(len(validated_data))
+        samples = [Sample(**attrs, sample_id=sample_id) for attrs, sample_id in zip(validated_data, sample_ids)]
+
+        request = self.context.get("request")
+        history_user = self.context.get("user")
+        if history_user is None and request is not None and request.user.is_authenticated:
+            history_user = request.user
+
+        # write the samples and their historical records in batches rather than one save per row
+        samples = bulk_create_with_history(
+            samples, Sample, batch_size=BULK_CREATE_BATCH_SIZE, default_user=history_user
+        )
+        # bulk inserts skip the signals, so the new samples' (empty) status summaries are written here
+        SampleStatus.objects.bulk_create(
+            [SampleStatus(sample=sample) for sample in samples], batch_size=BULK_CREATE_BATCH_SIZE
+        )
+        return samples
+
+
 class SampleSerializer(serializers.ModelSerializer):
-    submitting_lab = serializers.SlugRelatedField(slug_field="lab_name", queryset=Lab.objects.all())
-    bmh_project = serializers.SlugRelatedField(
-        slug_field="project_name", queryset=Project.objects.all(), allow_null=True
-    )
+    submitting_lab = CachedSlugRelatedField(slug_field="lab_name", queryset=Lab.objects.all())
+    bmh_project = CachedSlugRelatedField(slug_field="project_name", queryset=Project.objects.all(), allow_null=True)
     sample_type = SampleTypeField()
 
     # allow nulls where appropriate
@@ -101,27 +170,90 @@ class SampleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sample
         fields = "__all__"
+        read_only_fields = ["sample_id"]
+        list_serializer_class = SampleListSerializer
 
     def validate(self, attrs):
         submitting_lab = attrs.get("submitting_lab")
         sample_name = attrs.get("sample_name")
 
         # Check if a sample with the same submitting_lab and sample_name already exists
-        if Sample.objects.filter(submitting_lab=submitting_lab, sample_name=sample_name).exists():
+        existing_samples = self.context.get("existing_samples")
+        if existing_samples is None:
+            exists = Sample.objects.filter(submitting_lab=submitting_lab, sample_name=sample_name).exists()
+        else:
+            exists = (submitting_lab.pk, sample_name) in existing_samples
+        if exists:
             raise serializers.ValidationError(
                 f"Sample with the same sample name '{sample_name}' already exists for lab '{submitting_lab}'."
             )
 
-        return attrs
+        # Check if the same sample name appears more than once in this upload
+        uploaded_samples = self.context.get("uploaded_samples")
+        if uploaded_samples is not None:
+            if (submitting_lab.pk, sample_name) in uploaded_samples:
+                raise serializers.ValidationError(
+                    f"Sample name '{sample_name}' appears more than once in this upload for lab '{submitting_lab}'."
+                )
+            uploaded_samples.add((submitting_lab.pk, sample_name))
 
-    def create(self, validated_data):
-        validated_data["sample_id"] = generate_sample_id()
-        return Sample.objects.create(**validated_data)
+        return attrs
 
     def get_latest_workflow_execution(self, obj):
-        aliquots = obj.aliquot_set.all()
-        if aliquots.exists():
-            latest_execution = aliquots.latest("workflowexecution__modified")
-            serializer = WorkflowExecutionSerializer(latest_execution.workflowexecution_set.first())
-            return serializer.data
-        return None
+        # read from the sample's status summary, select_related it when serializing many samples.
+        # Samples created before the status summaries have none until rebuild_sample_status is run.
+        try:
+            latest_execution = obj.status_summary.latest_workflow_execution
+        except SampleStatus.DoesNotExist:
+            latest_execution = None
+        if latest_execution is None:
+            return None
+        return WorkflowExecutionSerializer(latest_execution).data
+
+
+class SampleTableSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the rows of the sample database table, with related objects
+    flattened to their names
+    """
+
+    submitting_lab = serializers.CharField(source="submitting_lab.lab_name", read_only=True)
+    bmh_project = serializers.CharField(source="bmh_project.project_name", read_only=True, allow_null=True)
+
+    class Meta:
+        model = Sample
+        fields = [
+            "sample_id",
+            "sample_name",
+            "tube_plate_label",
+            "well",
+            "submitting_lab",
+            "bmh_project",
+            "genus",
+            "species",
+            "created",
+            "requested_services",
+        ]
+        # species is shown in the genus column, which only requests genus
+        datatables_always_serialize = ["species"]
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    submitting_lab = serializers.SlugRelatedField(slug_field="lab_name", read_only=True)
+    bmh_project = serializers.SlugRelatedField(slug_field="project_name", read_only=True)
+
+    class Meta:
+        model = UploadJob
+        fields = [
+            "id",
+            "status",
+            "submitting_lab",
+            "bmh_project",
+            "submitter_project",
+            "dry_run",
+            "rows_processed",
+            "samples_created",
+            "errors",
+            "created",
+            "modified",
+        ]
@@ -0,0 +1,61 @@
+from dataclasses import dataclass, field
+
+from .serializers import SampleSerializer
+
+
+@dataclass
+class IngestResult:
+    """
+    The outcome of validating or ingesting a list of sample records. ``errors`` holds
+    the serializer errors of each record, in the order of the records, and is empty when
+    every record is valid.
+    """
+
+    validated_data: list = field(default_factory=list)
+    samples: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+
+def validate_samples(records, lab=None, project=None, submitter_project=None, context=None):
+    """
+    Validate sample records given as dicts of native Python values. When ``lab`` is given,
+    every record is submitted for that lab and project, as with the upload form, otherwise
+    each record names its own lab and project. Pass the same ``context`` when validating
+    a sample sheet in chunks, so lookups are cached and duplicates are caught across them.
+    """
+    if lab is not None:
+        submission = {
+            "submitting_lab": lab.lab_name,
+            "bmh_project": project.project_name if project else None,
+            "submitter_project": submitter_project,
+        }
+        records = [{**record, **submission} for record in records]
+
+    serializer = SampleSerializer(data=records, many=True, context=context if context is not None else {})
+    if serializer.is_valid():
+        return IngestResult(validated_data=serializer.validated_data)
+    return IngestResult(errors=serializer.errors)
+
+
+def save_samples(validated_data, user=None):
+    """
+    Save samples from data returned by ``validate_samples``, recording ``user`` as the
+    author of their history. Returns the saved samples.
+    """
+    return SampleSerializer(many=True, context={"user": user}).create(validated_data)
+
+
+def ingest_samples(records, lab, project, user, submitter_project=None, dry_run=False, context=None):
+    """
+    Validate sample records and, if they are all valid and this isn't a dry run, save
+    them. Nothing is saved when any record has errors. The caller is responsible for
+    the transaction the samples are saved in.
+    """
+    result = validate_samples(records, lab, project, submitter_project, context)
+    if result.is_valid and not dry_run:
+        result.samples = save_samples(result.validated_data, user)
+    return result
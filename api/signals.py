@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .models import (
+    Aliquot,
+    Lab,
+    Sample,
+    SampleStatus,
+    WorkflowExecution,
+    create_sample_id_sequence,
+    refresh_sample_statuses,
+)
+from .scopes import clear_all_lab_ids, clear_user_lab_ids
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def clear_lab_ids_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # cleared once the change is committed, since a read before that would cache the old lab ids again
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        # user.groups was changed
+        user_ids = [instance.pk]
+        transaction.on_commit(lambda: clear_user_lab_ids(user_ids))
+    elif pk_set is not None:
+        # group.user_set was changed
+        user_ids = list(pk_set)
+        transaction.on_commit(lambda: clear_user_lab_ids(user_ids))
+    else:
+        # group.user_set was cleared, its former members aren't known any more
+        transaction.on_commit(clear_all_lab_ids)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Lab)
+@receiver(post_delete, sender=Lab)
+def clear_lab_ids_on_name_change(sender, **kwargs):
+    # groups are matched to labs by name, so any renamed, new or deleted group or lab can change anyone's labs
+    transaction.on_commit(clear_all_lab_ids)
+
+
+@receiver(post_save, sender=Sample)
+def create_sample_status(sender, instance, created, raw, **kwargs):
+    # a new sample has no aliquots yet, so its status summary starts out empty
+    if created and not raw:
+        SampleStatus.objects.get_or_create(sample=instance)
+
+
+def _get_sample_id(instance):
+    if isinstance(instance, Aliquot):
+        return instance.sample_id
+    return Aliquot.objects.filter(pk=instance.aliquot_id).values_list("sample_id", flat=True).first()
+
+
+@receiver(post_save, sender=Aliquot)
+@receiver(post_save, sender=WorkflowExecution)
+def refresh_sample_status_on_save(sender, instance, **kwargs):
+    refresh_sample_statuses(Sample.objects.filter(pk=_get_sample_id(instance)))
+
+
+@receiver(post_delete, sender=Aliquot)
+@receiver(post_delete, sender=WorkflowExecution)
+def refresh_sample_status_on_delete(sender, instance, **kwargs):
+    # the sample may be being deleted along with it, so only refresh it once that's settled
+    sample_id = _get_sample_id(instance)
+    transaction.on_commit(lambda: refresh_sample_statuses(Sample.objects.filter(pk=sample_id)))
+
+
+@receiver(post_migrate)
+def create_sample_id_sequence_after_migrate(sender, using, **kwargs):
+    # the sequence isn't part of any model, so it's created once the api tables are, with or without migrations
+    if sender.name == "api":
+        create_sample_id_sequence(using)
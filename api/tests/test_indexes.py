@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from api.models import Sample, WorkflowExecution
+from api.tests.factories import SampleFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def samples():
+    SampleFactory.create_batch(20)
+    if connection.vendor == "postgresql":
+        # the planner prefers scanning tables as small as these, make it show the index it would use
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+
+def _assert_uses_index(queryset, expected):
+    # expected is the index name, or a column of the index when the database names the index itself
+    plan = queryset.explain()
+    assert "INDEX" in plan.upper(), plan
+    assert expected in plan, plan
+
+
+def test_sample_id_lookup_uses_index():
+    _assert_uses_index(Sample.objects.filter(sample_id="LIMS-2023-000001"), "sample_id")
+
+
+def test_sample_name_per_lab_lookup_uses_index():
+    sample = Sample.objects.first()
+    _assert_uses_index(
+        Sample.objects.filter(submitting_lab=sample.submitting_lab, sample_name=sample.sample_name),
+        "sample_name",
+    )
+
+
+def test_created_ordering_uses_index():
+    _assert_uses_index(Sample.objects.order_by("created", "id")[:10], "sample_created_id_idx")
+
+
+def test_modified_lookup_uses_index():
+    _assert_uses_index(Sample.objects.filter(modified__gte=timezone.now() - timedelta(hours=1)), "sample_modified_idx")
+
+
+def test_latest_execution_lookup_uses_index():
+    sample = Sample.objects.first()
+    _assert_uses_index(
+        WorkflowExecution.objects.filter(aliquot__sample=sample).order_by("-modified", "-id"),
+        "execution_aliquot_modified_idx",
+    )
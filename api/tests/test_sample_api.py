@@ -1,9 +1,24 @@
+import csv
+import gzip
+import io
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
 from rest_framework.test import APIRequestFactory
 
-from api.tests.factories import LabFactory, SampleFactory
+from api import views
+from api.models import Aliquot, Batch, Sample, Workflow, WorkflowExecution, refresh_sample_statuses
+from api.renderers import CSVRenderer, iter_xlsx
+from api.serializers import SampleSerializer
+from api.tests.factories import LabFactory, ProjectFactory, SampleFactory
 from api.views import SampleAPIView
 from bmh_sample_tracker.users.tests.factories import UserFactory
 
@@ -56,3 +71,365 @@ def test_sample_api_view_only_shows_samples_from_user_labs(api_client, staff_use
     _test_sample_view_for_user(user2, [sample2.id], factory, url)
     _test_sample_view_for_user(user3, [sample1.id, sample2.id], factory, url)
     _test_sample_view_for_user(staff_user, [sample1.id, sample2.id, sample3.id], factory, url)
+
+
+def _add_workflow_executions(sample, workflow, batch, statuses):
+    aliquot = Aliquot.objects.create(sample=sample, batch=batch)
+    return [WorkflowExecution.objects.create(aliquot=aliquot, workflow=workflow, status=s) for s in statuses]
+
+
+def _get_samples(user):
+    request = APIRequestFactory().get(reverse("api:sample-list"))
+    request.user = user
+    with CaptureQueriesContext(connection) as context:
+        response = SampleAPIView.as_view()(request)
+    return response, len(context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_sample_api_view_latest_workflow_execution(staff_user):
+    workflow = Workflow.objects.create(workflow_name="DNA extraction")
+    batch = Batch.objects.create(batch_name="batch1")
+    sample = SampleFactory()
+    first, second = _add_workflow_executions(sample, workflow, batch, ["COMPLETE", "IN_PROGRESS"])
+    (third,) = _add_workflow_executions(sample, workflow, batch, ["FAIL"])
+    WorkflowExecution.objects.filter(pk=first.pk).update(modified=timezone.now() + timedelta(days=1))
+    # queryset updates skip the signals that keep the status summary up to date
+    refresh_sample_statuses(Sample.objects.filter(pk=sample.pk))
+    SampleFactory()
+
+    response, _ = _get_samples(staff_user)
+
+    executions = {row["id"]: row["latest_workflow_execution"] for row in response.data}
+    assert executions[sample.id]["id"] == first.id
+    assert executions[sample.id]["workflow"] == {"id": workflow.id, "workflow_name": "DNA extraction"}
+    assert list(executions.values()).count(None) == 1
+
+
+@pytest.mark.django_db
+def test_sample_api_view_query_count_does_not_grow_with_samples(staff_user):
+    workflow = Workflow.objects.create(workflow_name="DNA extraction")
+    batch = Batch.objects.create(batch_name="batch1")
+
+    _add_workflow_executions(SampleFactory(), workflow, batch, ["COMPLETE"])
+    _, queries_for_one = _get_samples(staff_user)
+
+    for _ in range(10):
+        _add_workflow_executions(SampleFactory(), workflow, batch, ["COMPLETE", "IN_PROGRESS"])
+    response, queries_for_many = _get_samples(staff_user)
+
+    assert len(response.data) == 11
+    assert queries_for_many == queries_for_one
+
+
+@pytest.mark.django_db
+def test_sample_api_view_query_count_does_not_grow_with_uploaded_samples(staff_user, test_data_full):
+    def upload(rows):
+        serializer = SampleSerializer(data=rows, many=True)
+        assert serializer.is_valid(), serializer.errors
+        serializer.save()
+
+    # uploaded samples are bulk created and have no aliquots yet
+    upload(test_data_full[:1])
+    _, queries_for_one = _get_samples(staff_user)
+
+    upload([dict(test_data_full[0], sample_name=f"Uploaded_{i}") for i in range(20)])
+    response, queries_for_many = _get_samples(staff_user)
+
+    assert len(response.data) == 21
+    assert all(row["latest_workflow_execution"] is None for row in response.data)
+    assert queries_for_many == queries_for_one
+
+
+def _read_csv_export(response):
+    assert response.streaming
+    return list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+
+@pytest.mark.django_db
+def test_sample_api_view_streams_csv(client, staff_user, monkeypatch):
+    monkeypatch.setattr(views, "EXPORT_CHUNK_SIZE", 2)
+    samples = [SampleFactory(sample_name=f"Sample{i}") for i in range(5)]
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list"), {"format": "csv", "column1": "Sample"})
+
+    assert response["Content-Type"] == "text/csv"
+    rows = _read_csv_export(response)
+    assert sorted(row["sample_id"] for row in rows) == sorted(sample.sample_id for sample in samples)
+    assert rows[0]["submitting_lab"] == samples[0].submitting_lab.lab_name
+
+
+@pytest.mark.django_db
+def test_sample_api_view_streams_empty_csv(client, staff_user):
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list"), {"format": "csv"})
+
+    content = b"".join(response.streaming_content).decode()
+    assert content.splitlines()[0].startswith("id,")
+    assert len(content.splitlines()) == 1
+
+
+def test_csv_renderer_renders_empty_data():
+    assert CSVRenderer().render([]) == ""
+
+
+@pytest.mark.django_db
+def test_sample_cursor_api_view_walks_every_sample(api_client, staff_user):
+    samples = [SampleFactory() for _ in range(7)]
+    api_client.force_login(staff_user)
+
+    sample_ids = []
+    url = reverse("api:sample-cursor") + "?format=json&page_size=3"
+    while url:
+        response = api_client.get(url)
+        assert response.status_code == 200
+        sample_ids += [row["sample_id"] for row in response.data["results"]]
+        url = response.data["next"]
+
+    assert sample_ids == [sample.sample_id for sample in samples]
+
+
+@pytest.mark.django_db
+def test_sample_cursor_api_view_seeks_instead_of_offset(api_client, staff_user):
+    for _ in range(4):
+        SampleFactory()
+    api_client.force_login(staff_user)
+    response = api_client.get(reverse("api:sample-cursor"), {"format": "json", "page_size": 2})
+
+    with CaptureQueriesContext(connection) as context:
+        api_client.get(response.data["next"])
+
+    page_query = next(q["sql"] for q in context.captured_queries if 'FROM "api_sample"' in q["sql"])
+    assert "OFFSET" not in page_query
+    assert '"api_sample"."id" >' in page_query
+
+
+@pytest.mark.django_db
+def test_sample_api_view_answers_unchanged_samples_with_not_modified(client, staff_user):
+    sample = SampleFactory()
+    client.force_login(staff_user)
+    url = reverse("api:sample-list") + "?format=csv"
+    response = client.get(url)
+    b"".join(response.streaming_content)
+
+    with CaptureQueriesContext(connection) as context:
+        not_modified = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    assert not_modified.status_code == 304
+    assert not_modified["ETag"] == response["ETag"]
+    # only the aggregate is queried, the samples themselves are never read
+    assert not any('"api_sample"."sample_name"' in query["sql"] for query in context.captured_queries)
+    assert len([query for query in context.captured_queries if '"api_sample"' in query["sql"]]) == 1
+    assert not any('"api_workflowexecution"' in query["sql"] for query in context.captured_queries)
+
+    assert not response.has_header("Last-Modified")
+
+    sample.sample_name = "Renamed"
+    sample.save()
+    assert client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 200
+
+
+@pytest.mark.django_db
+def test_sample_api_view_etag_changes_with_removed_samples(client, staff_user):
+    SampleFactory()
+    newest = SampleFactory()
+    client.force_login(staff_user)
+    url = reverse("api:sample-list") + "?format=csv"
+    etag = client.get(url)["ETag"]
+
+    Sample.objects.exclude(pk=newest.pk).delete()
+
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_sample_api_view_etag_changes_with_renamed_labs_and_projects(client, staff_user):
+    sample = SampleFactory(bmh_project=ProjectFactory())
+    client.force_login(staff_user)
+    url = reverse("api:sample-list") + "?format=csv"
+    etag = client.get(url)["ETag"]
+
+    lab = sample.submitting_lab
+    lab.lab_name = "Renamed"
+    lab.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    etag = response["ETag"]
+
+    project = sample.bmh_project
+    project.project_name = "Renamed"
+    project.save()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_sample_api_view_etag_changes_with_workflow_executions(client, staff_user):
+    sample = SampleFactory()
+    client.force_login(staff_user)
+    url = reverse("api:sample-list") + "?format=csv"
+    etag = client.get(url)["ETag"]
+
+    workflow = Workflow.objects.create(workflow_name="DNA extraction")
+    _add_workflow_executions(sample, workflow, Batch.objects.create(batch_name="batch1"), ["COMPLETE"])
+
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_sample_api_view_etag_depends_on_filters_and_lab_scope(client, staff_user):
+    lab = LabFactory()
+    SampleFactory(submitting_lab=lab)
+    member = UserFactory()
+    member.groups.set([Group.objects.get(name=lab.lab_name)])
+    url = reverse("api:sample-list") + "?format=csv"
+
+    client.force_login(staff_user)
+    staff_etag = client.get(url)["ETag"]
+    filtered_etag = client.get(url + "&column1=a")["ETag"]
+    client.force_login(member)
+    member_etag = client.get(url)["ETag"]
+
+    # the member and staff see the same single sample, but the two responses are kept apart anyway
+    assert len({staff_etag, filtered_etag, member_etag}) == 3
+
+
+def _read_export(response):
+    assert response.streaming
+    return io.BytesIO(b"".join(response.streaming_content))
+
+
+@pytest.mark.django_db
+def test_sample_api_view_streams_parquet(client, staff_user, monkeypatch):
+    monkeypatch.setattr(views, "EXPORT_CHUNK_SIZE", 2)
+    samples = [SampleFactory(sample_type="DNA", culture_date=date(2023, 1, i + 1)) for i in range(5)]
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list") + "?format=parquet")
+
+    assert response["Content-Type"] == "application/vnd.apache.parquet"
+    parquet_file = pq.ParquetFile(_read_export(response))
+    # one row group per batch read from the database
+    assert parquet_file.metadata.num_row_groups == 3
+    table = parquet_file.read()
+    assert table.column("sample_id").to_pylist() == [sample.sample_id for sample in samples]
+    assert table.column("culture_date").to_pylist() == [sample.culture_date for sample in samples]
+    assert table.schema.field("sample_volume_in_ul").type == pa.float64()
+    assert table.column("submitting_lab").to_pylist()[0] == samples[0].submitting_lab.lab_name
+    assert table.column("sample_type").to_pylist()[0] == "DNA"
+
+
+@pytest.mark.django_db
+def test_sample_api_view_streams_empty_parquet(client, staff_user):
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list") + "?format=parquet")
+
+    table = pq.read_table(_read_export(response))
+    assert table.num_rows == 0
+    assert "sample_id" in table.column_names
+
+
+@pytest.mark.django_db
+def test_sample_api_view_streams_xlsx(client, staff_user):
+    sample = SampleFactory(sample_type="CELLS", sample_volume_in_ul=12.5)
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list") + "?format=xlsx")
+
+    assert response["Content-Disposition"] == 'attachment; filename="samples.xlsx"'
+    rows = list(load_workbook(_read_export(response), read_only=True).active.values)
+    header, row = rows
+    row = dict(zip(header, row))
+    assert row["sample_id"] == sample.sample_id
+    assert row["sample_volume_in_ul"] == 12.5
+    assert row["sample_type"] == "Cells (in DNA/RNA shield)"
+    assert isinstance(row["created"], datetime)
+
+
+def test_iter_xlsx_yields_each_batch_as_it_is_read():
+    read = []
+
+    def batches():
+        for i in range(3):
+            read.append(i)
+            yield [(i, f"Sample{i}")]
+
+    chunks = iter_xlsx(batches(), ["id", "sample_name"])
+
+    # the start of the file is sent before the later batches are read
+    first = next(chunks)
+    assert first.startswith(b"PK") and read == [0]
+    content = first + b"".join(chunks)
+    assert read == [0, 1, 2]
+    rows = list(load_workbook(io.BytesIO(content), read_only=True).active.values)
+    assert rows == [("id", "sample_name"), (0, "Sample0"), (1, "Sample1"), (2, "Sample2")]
+
+
+@pytest.mark.django_db
+def test_sample_api_view_compresses_csv_export_for_accepting_clients(client, staff_user):
+    samples = [SampleFactory() for _ in range(3)]
+    client.force_login(staff_user)
+    url = reverse("api:sample-list") + "?format=csv"
+
+    response = client.get(url, HTTP_ACCEPT_ENCODING="br;q=1.0, gzip;q=0.8")
+
+    assert response["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response["Vary"]
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(b"".join(response.streaming_content)).decode())))
+    assert sorted(row["sample_id"] for row in rows) == sorted(sample.sample_id for sample in samples)
+
+    uncompressed = client.get(url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+    assert not uncompressed.has_header("Content-Encoding")
+    assert uncompressed["ETag"] != response["ETag"]
+
+
+@pytest.mark.django_db
+def test_sample_api_view_compresses_exports_on_request(client, staff_user):
+    SampleFactory()
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list") + "?format=parquet&compress=gzip")
+
+    assert response["Content-Encoding"] == "gzip"
+    table = pq.read_table(io.BytesIO(gzip.decompress(b"".join(response.streaming_content))))
+    assert table.num_rows == 1
+
+    # parquet is already compressed, so it is only compressed again when asked for
+    assert not client.get(reverse("api:sample-list") + "?format=parquet", HTTP_ACCEPT_ENCODING="gzip").has_header(
+        "Content-Encoding"
+    )
+
+
+@pytest.mark.django_db
+def test_sample_api_view_compresses_with_zstd(client, staff_user):
+    zstandard = pytest.importorskip("zstandard")
+    SampleFactory()
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list") + "?format=csv", HTTP_ACCEPT_ENCODING="gzip, zstd")
+
+    assert response["Content-Encoding"] == "zstd"
+    content = zstandard.ZstdDecompressor().decompressobj().decompress(b"".join(response.streaming_content))
+    assert content.decode().startswith("id,")
+
+
+@pytest.mark.django_db
+def test_sample_api_view_rejects_unknown_compression(client, staff_user):
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list") + "?format=csv&compress=lzma")
+
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("export_format", ["parquet", "xlsx"])
+def test_sample_api_view_sends_export_errors_as_json(client, staff_user, export_format):
+    client.force_login(staff_user)
+
+    response = client.get(reverse("api:sample-list") + f"?format={export_format}&compress=lzma")
+
+    assert response.status_code == 400
+    assert response["Content-Type"] == "application/json"
+    assert "compress" in response.json()
@@ -0,0 +1,75 @@
+import re
+
+import pytest
+from django.db import connection
+
+from api.models import (
+    SAMPLE_ID_SEQUENCE,
+    Sample,
+    SampleIdCounter,
+    create_sample_id_sequence,
+    generate_sample_id,
+    reserve_sample_ids,
+)
+from api.tests.factories import LabFactory, SampleFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _number(sample_id):
+    return int(re.match(r"^LIMS-\d{4}-(\d{6,})$", sample_id).group(1))
+
+
+def test_reserve_sample_ids_are_unique_and_increasing():
+    numbers = [_number(sample_id) for sample_id in reserve_sample_ids(5)]
+    assert len(set(numbers)) == 5
+    assert numbers == sorted(numbers)
+
+
+def test_reserve_sample_ids_blocks_do_not_overlap():
+    first = reserve_sample_ids(3)
+    second = reserve_sample_ids(3)
+    third = generate_sample_id()
+    assert not set(first) & set(second)
+    assert _number(second[0]) > _number(first[-1])
+    assert _number(third) > _number(second[-1])
+
+
+def test_reserve_sample_ids_continues_from_existing_samples():
+    sample = SampleFactory()
+    if connection.vendor == "postgresql":
+        # the sequence is seeded when it is created after migrating, so create it again now there is a sample
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP SEQUENCE {SAMPLE_ID_SEQUENCE}")
+        create_sample_id_sequence()
+    assert _number(generate_sample_id()) == sample.id + 1
+    if connection.vendor != "postgresql":
+        assert SampleIdCounter.objects.get(name=SampleIdCounter.SAMPLE_ID).value == sample.id + 1
+
+
+def test_reserve_sample_ids_empty_block():
+    assert reserve_sample_ids(0) == []
+    assert not SampleIdCounter.objects.exists()
+
+
+def test_sample_id_is_reserved_when_a_sample_is_saved():
+    samples = [
+        Sample(
+            sample_name=f"sample{i}",
+            tube_plate_label="tube1",
+            submitting_lab=LabFactory(),
+            sample_type="DNA",
+            sample_volume_in_ul=10,
+            requested_services="WGS",
+            genus="Escherichia",
+            species="coli",
+        )
+        for i in range(2)
+    ]
+    assert [sample.sample_id for sample in samples] == ["", ""]
+    assert not SampleIdCounter.objects.exists()
+
+    for sample in samples:
+        sample.save()
+        sample.refresh_from_db()
+    assert _number(samples[1].sample_id) > _number(samples[0].sample_id)
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.models import Aliquot, Batch, SampleStatus, Workflow, WorkflowExecution
+from api.serializers import SampleSerializer
+from api.tests.factories import SampleFactory
+
+
+@pytest.fixture
+def workflow():
+    return Workflow.objects.create(workflow_name="DNA extraction")
+
+
+@pytest.fixture
+def batch():
+    return Batch.objects.create(batch_name="batch1")
+
+
+@pytest.mark.django_db
+def test_sample_status_follows_aliquot_and_execution_saves(workflow, batch):
+    sample = SampleFactory()
+    aliquot = Aliquot.objects.create(sample=sample, batch=batch)
+
+    status = SampleStatus.objects.get(sample=sample)
+    assert status.aliquot_count == 1
+    assert status.latest_workflow_execution is None
+    assert status.last_activity == aliquot.modified
+
+    execution = WorkflowExecution.objects.create(aliquot=aliquot, workflow=workflow, status="IN_PROGRESS")
+    Aliquot.objects.create(sample=sample, batch=batch)
+    execution.status = "COMPLETE"
+    execution.save()
+
+    status.refresh_from_db()
+    assert status.aliquot_count == 2
+    assert status.latest_workflow_execution == execution
+    assert status.latest_workflow == workflow
+    assert status.status == "COMPLETE"
+    assert status.last_activity == execution.modified
+
+
+@pytest.mark.django_db
+def test_sample_status_is_created_with_samples(test_data_full):
+    sample = SampleFactory()
+    serializer = SampleSerializer(data=test_data_full, many=True)
+    assert serializer.is_valid()
+    uploaded = serializer.save()
+
+    statuses = SampleStatus.objects.in_bulk([sample.pk] + [sample.pk for sample in uploaded])
+    assert len(statuses) == 4
+    assert all(status.aliquot_count == 0 and status.latest_workflow_execution is None for status in statuses.values())
+
+
+@pytest.mark.django_db
+def test_sample_status_follows_deletes(workflow, batch, django_capture_on_commit_callbacks):
+    sample = SampleFactory()
+    aliquot = Aliquot.objects.create(sample=sample, batch=batch)
+    first = WorkflowExecution.objects.create(aliquot=aliquot, workflow=workflow, status="COMPLETE")
+    second = WorkflowExecution.objects.create(aliquot=aliquot, workflow=workflow, status="FAIL")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    status = SampleStatus.objects.get(sample=sample)
+    assert status.latest_workflow_execution == first
+    assert status.status == "COMPLETE"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        aliquot.delete()
+    status.refresh_from_db()
+    assert status.aliquot_count == 0
+    assert status.latest_workflow_execution is None
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Aliquot.objects.create(sample=sample, batch=batch)
+        sample.delete()
+    assert not SampleStatus.objects.exists()
+
+
+@pytest.mark.django_db
+def test_rebuild_sample_status_command(workflow, batch, capsys):
+    samples = [SampleFactory() for _ in range(5)]
+    aliquot = Aliquot.objects.create(sample=samples[0], batch=batch)
+    first = WorkflowExecution.objects.create(aliquot=aliquot, workflow=workflow, status="COMPLETE")
+    WorkflowExecution.objects.create(aliquot=aliquot, workflow=workflow, status="FAIL")
+    # neither of these go through the signals
+    WorkflowExecution.objects.filter(pk=first.pk).update(modified=timezone.now() + timedelta(days=1))
+    SampleStatus.objects.all().delete()
+
+    call_command("rebuild_sample_status", batch_size=2)
+
+    assert "Rebuilt the status of 5 samples." in capsys.readouterr().out
+    statuses = {status.sample_id: status for status in SampleStatus.objects.all()}
+    assert statuses.keys() == {sample.id for sample in samples}
+    assert statuses[samples[0].id].latest_workflow_execution == first
+    assert statuses[samples[0].id].aliquot_count == 1
+    assert statuses[samples[1].id].aliquot_count == 0
+    assert statuses[samples[1].id].last_activity is None
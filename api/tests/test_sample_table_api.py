@@ -0,0 +1,83 @@
+import pytest
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.tests.factories import LabFactory, SampleFactory
+from bmh_sample_tracker.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+COLUMNS = [
+    ("sample_id", ""),
+    ("sample_name", ""),
+    ("tube_plate_label", ""),
+    ("well", ""),
+    ("submitting_lab", "submitting_lab.lab_name"),
+    ("bmh_project", "bmh_project.project_name"),
+    ("genus", "genus, species"),
+    ("created", ""),
+    ("requested_services", ""),
+]
+
+
+def _datatables_params(start=0, length=10, order=(0, "desc"), search=None):
+    params = {"format": "datatables", "draw": 1, "start": start, "length": length}
+    for i, (data, name) in enumerate(COLUMNS):
+        params[f"columns[{i}][data]"] = data
+        params[f"columns[{i}][name]"] = name
+        params[f"columns[{i}][searchable]"] = "true"
+        params[f"columns[{i}][orderable]"] = "true"
+        params[f"columns[{i}][search][value]"] = (search or {}).get(i, "")
+    params["order[0][column]"], params["order[0][dir]"] = order
+    return params
+
+
+def test_sample_table_pages_in_the_database(api_client):
+    api_client.force_login(UserFactory(is_staff=True))
+    samples = [SampleFactory(sample_id=f"LIMS-2023-{i:06}") for i in range(25)]
+
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.get(reverse("api:sample-table"), _datatables_params(start=10, length=10))
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["recordsTotal"] == 25
+    assert data["recordsFiltered"] == 25
+    assert [row["sample_id"] for row in data["data"]] == [s.sample_id for s in reversed(samples)][10:20]
+    assert data["data"][0]["species"] == samples[14].species
+    # counts and one page of rows with their labs and projects, however many samples there are
+    assert len([q for q in context.captured_queries if q["sql"].startswith("SELECT")]) <= 5
+
+
+def test_sample_table_searches_columns(api_client):
+    api_client.force_login(UserFactory(is_staff=True))
+    lab = LabFactory(lab_name="Salmonella Lab")
+    SampleFactory(submitting_lab=lab, genus="Salmonella", sample_name="b")
+    SampleFactory(submitting_lab=lab, genus="Escherichia", sample_name="a")
+    SampleFactory(genus="Salmonella")
+
+    response = api_client.get(
+        reverse("api:sample-table"), _datatables_params(order=(1, "asc"), search={4: "salmonella l", 6: "Esch"})
+    )
+
+    data = response.json()
+    assert data["recordsTotal"] == 3
+    assert data["recordsFiltered"] == 1
+    assert [row["sample_name"] for row in data["data"]] == ["a"]
+
+
+def test_sample_table_only_shows_samples_from_user_labs(api_client):
+    lab = LabFactory()
+    user = UserFactory()
+    user.groups.set([Group.objects.get(name=lab.lab_name)])
+    sample = SampleFactory(submitting_lab=lab)
+    SampleFactory()
+    api_client.force_login(user)
+
+    response = api_client.get(reverse("api:sample-table"), _datatables_params())
+
+    data = response.json()
+    assert data["recordsTotal"] == 1
+    assert [row["sample_id"] for row in data["data"]] == [sample.sample_id]
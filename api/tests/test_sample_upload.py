@@ -2,12 +2,17 @@ import json
 
 import pytest
 from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db import connection
 from django.http import HttpResponseRedirect
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIRequestFactory
 
-from api.models import Sample
+from api.models import Lab, Sample, SampleIdCounter
+from api.scopes import get_user_lab_ids
+from api.tests.factories import SampleFactory
 from api.views import SampleUploadView
 
 pytestmark = pytest.mark.django_db
@@ -61,3 +66,173 @@ def test_sample_upload_invalid_lab(client, test_data_invalid_lab, user_factory):
         for errors in field_errors.values()
         for error in errors
     )
+
+
+def test_sample_upload_bulk_creates_samples_and_history(test_data_full, user_factory):
+    url = reverse("api:sample-upload")
+    factory = APIRequestFactory()
+    user = user_factory()
+    data = [dict(test_data_full[0], sample_name=f"Sample_{i}") for i in range(400)]
+    request = factory.post(url, data=json.dumps(data), format="json")
+    request.user = user
+    view = SampleUploadView.as_view()
+
+    with CaptureQueriesContext(connection) as context:
+        response = view(request)
+
+    # inserts are batched rather than issued (and then re-saved) once per row
+    writes = [q["sql"] for q in context.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))]
+    assert len(writes) < len(data) // 10
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert Sample.objects.count() == 400
+    assert Sample.history.filter(history_type="+").count() == 400
+    assert Sample.history.filter(history_user=user).count() == 400
+    assert len(set(Sample.objects.values_list("sample_id", flat=True))) == 400
+
+
+def test_sample_upload_reports_duplicates_per_row(test_data_full, user_factory):
+    url = reverse("api:sample-upload")
+    factory = APIRequestFactory()
+    user = user_factory()
+    lab = Lab.objects.get(lab_name=test_data_full[0]["submitting_lab"])
+    SampleFactory(submitting_lab=lab, sample_name="Sample_1")
+    data = test_data_full + [dict(test_data_full[1], tube_plate_label="Tube4")]
+    request = factory.post(url, data=json.dumps(data), format="json")
+    request.user = user
+    view = SampleUploadView.as_view()
+    response = view(request)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    errors = response.data["errors"]
+    assert "already exists" in str(errors[0]["non_field_errors"][0])
+    assert errors[1] == {}
+    assert errors[2] == {}
+    assert "appears more than once" in str(errors[3]["non_field_errors"][0])
+    assert Sample.objects.count() == 1
+
+
+def test_sample_upload_checks_existing_samples_once(test_data_full, user_factory):
+    url = reverse("api:sample-upload")
+    factory = APIRequestFactory()
+    user = user_factory()
+    data = [dict(test_data_full[0], sample_name=f"Sample_{i}") for i in range(50)]
+    request = factory.post(url, data=json.dumps(data), format="json")
+    request.user = user
+    view = SampleUploadView.as_view()
+
+    with CaptureQueriesContext(connection) as context:
+        response = view(request)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    lookups = [
+        q["sql"] for q in context.captured_queries if q["sql"].startswith("SELECT") and 'FROM "api_sample"' in q["sql"]
+    ]
+    assert len(lookups) == 1
+
+
+def test_sample_upload_resolves_lab_and_project_once(test_data_full, user_factory):
+    url = reverse("api:sample-upload")
+    factory = APIRequestFactory()
+    user = user_factory()
+    data = [dict(test_data_full[0], sample_name=f"Sample_{i}") for i in range(50)]
+    data.append(dict(test_data_full[0], sample_name="Sample_bad_lab", submitting_lab="9999999999"))
+    data.append(dict(test_data_full[0], sample_name="Sample_bad_lab_2", submitting_lab="9999999999"))
+    request = factory.post(url, data=json.dumps(data), format="json")
+    request.user = user
+    view = SampleUploadView.as_view()
+    # the user's labs are cached, as they are after their first request
+    get_user_lab_ids(user)
+
+    with CaptureQueriesContext(connection) as context:
+        response = view(request)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    errors = response.data["errors"]
+    assert "Object with lab_name=9999999999 does not exist." in str(errors[-1]["submitting_lab"])
+    assert "Object with lab_name=9999999999 does not exist." in str(errors[-2]["submitting_lab"])
+    assert len([q for q in context.captured_queries if 'FROM "api_lab"' in q["sql"]]) == 2
+    assert len([q for q in context.captured_queries if 'FROM "api_project"' in q["sql"]]) == 1
+
+
+def test_sample_upload_dry_run(test_data_full, user_factory):
+    url = reverse("api:sample-upload") + "?dry_run=1"
+    factory = APIRequestFactory()
+    user = user_factory()
+    request = factory.post(url, data=json.dumps(test_data_full), format="json")
+    request.user = user
+    view = SampleUploadView.as_view()
+    response = view(request)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["success"]
+    assert response.data["dry_run"]
+    assert not Sample.objects.exists()
+    assert not SampleIdCounter.objects.exists()
+
+
+def test_sample_upload_dry_run_reports_every_error(test_data_full, user_factory):
+    url = reverse("api:sample-upload") + "?dry_run=1"
+    factory = APIRequestFactory()
+    user = user_factory()
+    data = [
+        dict(test_data_full[0], sample_name="Sample 1"),
+        test_data_full[1],
+        dict(test_data_full[2], genus="Genus1", sample_volume_in_ul="lots"),
+    ]
+    request = factory.post(url, data=json.dumps(data), format="json")
+    request.user = user
+    view = SampleUploadView.as_view()
+    response = view(request)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["dry_run"]
+    errors = response.data["errors"]
+    assert set(errors[0]) == {"sample_name"}
+    assert errors[1] == {}
+    assert set(errors[2]) == {"genus", "sample_volume_in_ul"}
+
+
+def test_sample_upload_answers_resubmission_with_original_response(test_data_full, user_factory):
+    url = reverse("api:sample-upload")
+    factory = APIRequestFactory()
+    user = user_factory()
+    view = SampleUploadView.as_view()
+    request = factory.post(url, data=json.dumps(test_data_full), format="json")
+    request.user = user
+    view(request)
+
+    # the resubmission is answered from the receipt without validating the data
+    request = factory.post(url, data=json.dumps(test_data_full), format="json")
+    request.user = user
+    with CaptureQueriesContext(connection) as context:
+        response = view(request)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {"success": True, "message": "Sample uploaded successfully."}
+    assert Sample.objects.count() == 3
+    assert len(context.captured_queries) == 1
+
+
+def test_sample_upload_answers_resubmission_only_within_the_lab(test_data_full, user_factory):
+    url = reverse("api:sample-upload")
+    factory = APIRequestFactory()
+    view = SampleUploadView.as_view()
+    request = factory.post(url, data=json.dumps(test_data_full), format="json")
+    request.user = user_factory()
+    view(request)
+
+    lab = Lab.objects.get(lab_name=test_data_full[0]["submitting_lab"])
+    member, outsider = user_factory(), user_factory()
+    member.groups.set([Group.objects.get(name=lab.lab_name)])
+
+    request = factory.post(url, data=json.dumps(test_data_full), format="json")
+    request.user = member
+    assert view(request).status_code == status.HTTP_200_OK
+
+    # someone outside the lab gets the data validated again, which finds the samples already exist
+    request = factory.post(url, data=json.dumps(test_data_full), format="json")
+    request.user = outsider
+    response = view(request)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert Sample.objects.count() == 3
@@ -1,9 +1,11 @@
-from io import BytesIO
+import re
+from io import BytesIO, StringIO
 from tempfile import NamedTemporaryFile
 
 import pandas as pd
 import pytest
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
+from django.db import connection
 from factories import LabFactory, ProjectFactory
 
 from api.models import Sample
@@ -57,3 +59,158 @@ def test_upload_command(excel_data):
         assert len(samples) == 2
         assert samples[0].sample_name == "Sample1"
         assert samples[1].sample_name == "Sample2"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("suffix,sep", [(".csv", ","), (".tsv", "\t")])
+def test_upload_command_delimited(excel_data, suffix, sep):
+    df = pd.read_excel(BytesIO(excel_data))
+    with NamedTemporaryFile(suffix=suffix) as temp_file:
+        df.to_csv(temp_file.name, sep=sep, index=False, date_format="%Y-%m-%d")
+
+        call_command("upload_samples", temp_file.name)
+
+        samples = Sample.objects.order_by("sample_name")
+        assert [sample.sample_name for sample in samples] == ["Sample1", "Sample2"]
+        assert str(samples[1].dna_extraction_date) == "2021-01-04"
+        assert samples[1].approx_genome_size_in_bp == 2000
+
+
+@pytest.mark.django_db
+def test_upload_command_parquet(excel_data):
+    df = pd.read_excel(BytesIO(excel_data))
+    with NamedTemporaryFile(suffix=".parquet") as temp_file:
+        df.to_parquet(temp_file.name, index=False)
+
+        call_command("upload_samples", temp_file.name)
+
+        samples = Sample.objects.order_by("sample_name")
+        assert [sample.sample_name for sample in samples] == ["Sample1", "Sample2"]
+        assert str(samples[0].culture_date) == "2021-01-01"
+
+
+def test_upload_command_unsupported_file():
+    with pytest.raises(CommandError, match="Unsupported file type"):
+        call_command("upload_samples", "samples.json")
+
+
+def _write_csv(df, temp_file):
+    df.to_csv(temp_file.name, index=False, date_format="%Y-%m-%d")
+
+
+@pytest.mark.django_db
+def test_upload_command_commits_each_chunk(excel_data):
+    df = pd.read_excel(BytesIO(excel_data))
+    df.loc[1, "sample_type"] = "Not a sample type"
+    df = pd.concat([df, df.assign(sample_name=["Sample3", "Sample4"])], ignore_index=True)
+    out, err = StringIO(), StringIO()
+    with NamedTemporaryFile(suffix=".csv") as temp_file:
+        _write_csv(df, temp_file)
+
+        call_command("upload_samples", temp_file.name, "--chunk-size", "2", stdout=out, stderr=err)
+
+    # rows with errors are skipped, the valid rows of every chunk are saved
+    assert sorted(Sample.objects.values_list("sample_name", flat=True)) == ["Sample1", "Sample3"]
+    assert "Read 4 rows in 2 chunks" in out.getvalue()
+    assert "2 samples uploaded successfully." in out.getvalue()
+    assert "2 errors" in err.getvalue()
+    assert "3, sample_type:" in err.getvalue()
+    assert "5, sample_type:" in err.getvalue()
+
+
+@pytest.mark.django_db
+def test_upload_command_duplicates_across_chunks(excel_data):
+    df = pd.read_excel(BytesIO(excel_data))
+    df = pd.concat([df, df.assign(sample_name=["Sample3", "Sample1"])], ignore_index=True)
+    err = StringIO()
+    with NamedTemporaryFile(suffix=".csv") as temp_file:
+        _write_csv(df, temp_file)
+
+        call_command("upload_samples", temp_file.name, "--chunk-size", "2", stdout=StringIO(), stderr=err)
+
+    assert sorted(Sample.objects.values_list("sample_name", flat=True)) == ["Sample1", "Sample2", "Sample3"]
+    # the first chunk is saved before the second is validated, so the later row is reported either way
+    assert "5, non_field_errors: " in err.getvalue()
+    assert "'Sample1'" in err.getvalue()
+
+
+@pytest.mark.django_db
+def test_upload_command_dry_run(excel_data):
+    out = StringIO()
+    with NamedTemporaryFile(suffix=".xlsx") as temp_file:
+        temp_file.write(excel_data)
+        temp_file.flush()
+
+        call_command("upload_samples", temp_file.name, "--dry-run", stdout=out)
+
+    assert not Sample.objects.exists()
+    assert "2 samples are valid. Dry run, nothing saved." in out.getvalue()
+
+
+def _duplicates_csv(excel_data, temp_file):
+    df = pd.read_excel(BytesIO(excel_data))
+    df = pd.concat([df.iloc[[0]]] * 6, ignore_index=True)
+    df["sample_name"] = ["A_1", "B_1", "B_1", "C_1", "A_1", "C_3"]
+    df["tube_plate_label"] = [f"S{i}" for i in range(6)]
+    _write_csv(df, temp_file)
+
+
+@pytest.mark.django_db
+def test_upload_command_duplicates_within_a_chunk(excel_data):
+    out, err = StringIO(), StringIO()
+    with NamedTemporaryFile(suffix=".csv") as temp_file:
+        _duplicates_csv(excel_data, temp_file)
+
+        call_command("upload_samples", temp_file.name, "--chunk-size", "3", stdout=out, stderr=err)
+
+    # the first row with each name is saved along with the rest of its chunk, the later ones are reported
+    assert sorted(Sample.objects.values_list("sample_name", flat=True)) == ["A_1", "B_1", "C_1", "C_3"]
+    assert "4 samples uploaded successfully." in out.getvalue()
+    assert "2 errors" in err.getvalue()
+    assert "4, sample_name: Sample name 'B_1' appears more than once in this file (first in row 3)." in err.getvalue()
+    # the first A_1 was saved with the earlier chunk before this one was validated
+    assert re.search(r"  6, \w+: .*'A_1'", err.getvalue())
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("chunk_size", ["1", "2", "6"])
+def test_upload_command_duplicates_do_not_depend_on_chunk_size(excel_data, chunk_size):
+    err = StringIO()
+    with NamedTemporaryFile(suffix=".csv") as temp_file:
+        _duplicates_csv(excel_data, temp_file)
+
+        call_command("upload_samples", temp_file.name, "--chunk-size", chunk_size, stdout=StringIO(), stderr=err)
+
+    assert sorted(Sample.objects.values_list("sample_name", flat=True)) == ["A_1", "B_1", "C_1", "C_3"]
+    assert "2 errors" in err.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_upload_command_validates_chunks_in_worker_processes(excel_data):
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        pytest.skip("worker processes can't open the in-memory test database")
+    out, err = StringIO(), StringIO()
+    with NamedTemporaryFile(suffix=".csv") as temp_file:
+        _duplicates_csv(excel_data, temp_file)
+
+        call_command("upload_samples", temp_file.name, "--chunk-size", "2", "--workers", "2", stdout=out, stderr=err)
+
+    # chunks are validated in parallel, but saved and checked for duplicates in file order
+    assert sorted(Sample.objects.values_list("sample_name", flat=True)) == ["A_1", "B_1", "C_1", "C_3"]
+    assert "Read 6 rows in 3 chunks" in out.getvalue()
+    assert "4, sample_name: Sample name 'B_1' appears more than once in this file (first in row 3)." in err.getvalue()
+    # saved with an earlier chunk, or still in flight when validated in parallel
+    assert re.search(r"  6, \w+: .*'A_1'", err.getvalue())
+
+
+@pytest.mark.django_db
+def test_upload_command_reports_rows_of_rejected_chunks(excel_data):
+    df = pd.read_excel(BytesIO(excel_data)).drop(columns=["genus"])
+    err = StringIO()
+    with NamedTemporaryFile(suffix=".csv") as temp_file:
+        _write_csv(df, temp_file)
+
+        call_command("upload_samples", temp_file.name, stdout=StringIO(), stderr=err)
+
+    assert not Sample.objects.exists()
+    assert "Rows 2-3 were not uploaded: Missing required columns: genus" in err.getvalue()
@@ -0,0 +1,101 @@
+import pytest
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Sample
+from api.scopes import _cache_key, get_user_lab_ids, scope_to_user_labs
+from api.tests.factories import LabFactory, SampleFactory
+from bmh_sample_tracker.users.tests.factories import UserFactory
+
+
+def _user_in_labs(*labs, **kwargs):
+    user = UserFactory(**kwargs)
+    user.groups.set(Group.objects.filter(name__in=[lab.lab_name for lab in labs]))
+    return user
+
+
+@pytest.mark.django_db
+def test_get_user_lab_ids_matches_groups_to_labs_by_name():
+    lab1, lab2 = LabFactory(), LabFactory()
+    # a group that isn't named after a lab gives no lab
+    Group.objects.create(name="Reviewers")
+    user = _user_in_labs(lab1)
+    user.groups.add(Group.objects.get(name="Reviewers"))
+
+    assert get_user_lab_ids(user) == [lab1.id]
+    assert set(get_user_lab_ids(_user_in_labs(lab1, lab2))) == {lab1.id, lab2.id}
+
+
+@pytest.mark.django_db
+def test_get_user_lab_ids_is_cached():
+    user = _user_in_labs(LabFactory())
+    get_user_lab_ids(user)
+
+    with CaptureQueriesContext(connection) as context:
+        get_user_lab_ids(user)
+    assert len(context.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_get_user_lab_ids_follows_membership_changes(django_capture_on_commit_callbacks):
+    lab1, lab2 = LabFactory(), LabFactory()
+    user = _user_in_labs(lab1)
+    assert get_user_lab_ids(user) == [lab1.id]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.groups.add(Group.objects.get(name=lab2.lab_name))
+    assert set(get_user_lab_ids(user)) == {lab1.id, lab2.id}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Group.objects.get(name=lab1.lab_name).user_set.remove(user)
+    assert get_user_lab_ids(user) == [lab2.id]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Group.objects.get(name=lab2.lab_name).user_set.clear()
+    assert get_user_lab_ids(user) == []
+
+
+@pytest.mark.django_db
+def test_get_user_lab_ids_are_cleared_once_the_change_is_committed(django_capture_on_commit_callbacks):
+    lab1, lab2 = LabFactory(), LabFactory()
+    user = _user_in_labs(lab1, lab2)
+    assert set(get_user_lab_ids(user)) == {lab1.id, lab2.id}
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        user.groups.remove(Group.objects.get(name=lab2.lab_name))
+        # as a concurrent request that reads the memberships before the commit would
+        cache.set(_cache_key(user.pk), [lab1.id, lab2.id])
+
+    for callback in callbacks:
+        callback()
+    assert get_user_lab_ids(user) == [lab1.id]
+
+
+@pytest.mark.django_db
+def test_get_user_lab_ids_follows_lab_renames(django_capture_on_commit_callbacks):
+    lab = LabFactory()
+    user = _user_in_labs(lab)
+    assert get_user_lab_ids(user) == [lab.id]
+
+    lab.lab_name = "Renamed lab"
+    with django_capture_on_commit_callbacks(execute=True):
+        lab.save()
+    assert get_user_lab_ids(user) == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.groups.add(Group.objects.create(name="Renamed lab"))
+    assert get_user_lab_ids(user) == [lab.id]
+
+
+@pytest.mark.django_db
+def test_scope_to_user_labs():
+    lab1, lab2 = LabFactory(), LabFactory()
+    sample1, sample2 = SampleFactory(submitting_lab=lab1), SampleFactory(submitting_lab=lab2)
+
+    samples = scope_to_user_labs(Sample.objects.all(), _user_in_labs(lab1))
+    assert list(samples) == [sample1]
+
+    samples = scope_to_user_labs(Sample.objects.all(), UserFactory(is_staff=True))
+    assert set(samples) == {sample1, sample2}
@@ -0,0 +1,50 @@
+import pytest
+
+from api.models import Sample
+from api.services import ingest_samples
+from api.tests.factories import LabFactory, ProjectFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_ingest_samples(test_data_full, user_factory):
+    user = user_factory()
+
+    result = ingest_samples(test_data_full, None, None, user)
+
+    assert result.is_valid
+    assert result.errors == []
+    assert sorted(sample.sample_name for sample in result.samples) == ["Sample_1", "Sample_2", "Sample_3"]
+    assert Sample.objects.count() == 3
+    assert Sample.history.filter(history_user=user).count() == 3
+
+
+def test_ingest_samples_for_lab_and_project(test_data_full, user_factory):
+    lab = LabFactory()
+    project = ProjectFactory(supporting_lab=lab)
+
+    result = ingest_samples(test_data_full, lab, project, user_factory())
+
+    assert result.is_valid
+    assert set(Sample.objects.values_list("submitting_lab", "bmh_project")) == {(lab.pk, project.pk)}
+
+
+def test_ingest_samples_saves_nothing_when_a_record_is_invalid(test_data_full, user_factory):
+    test_data_full[1]["genus"] = "Genus 1"
+
+    result = ingest_samples(test_data_full, None, None, user_factory())
+
+    assert not result.is_valid
+    assert result.samples == []
+    assert result.errors[0] == {} and result.errors[2] == {}
+    assert "genus" in result.errors[1]
+    assert not Sample.objects.exists()
+
+
+def test_ingest_samples_dry_run(test_data_full, user_factory):
+    result = ingest_samples(test_data_full, None, None, user_factory(), dry_run=True)
+
+    assert result.is_valid
+    assert len(result.validated_data) == 3
+    assert result.samples == []
+    assert not Sample.objects.exists()
@@ -0,0 +1,41 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from api.models import UploadJob
+from api.tests.factories import LabFactory
+from bmh_sample_tracker.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def upload_job():
+    return UploadJob.objects.create(
+        user=UserFactory(),
+        submitting_lab=LabFactory(),
+        submitter_project="proj1",
+        sample_sheet=SimpleUploadedFile("sample_sheet.xlsx", b"data"),
+        status="FAILED",
+        rows_processed=3,
+        errors=[{"row": 2, "field": "sample_name", "message": "This field may not be blank."}],
+    )
+
+
+def test_upload_job_status(api_client, upload_job):
+    api_client.force_login(upload_job.user)
+    response = api_client.get(reverse("api:upload-job", kwargs={"job_id": upload_job.id}), {"format": "json"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["status"] == "FAILED"
+    assert response.data["submitting_lab"] == upload_job.submitting_lab.lab_name
+    assert response.data["rows_processed"] == 3
+    assert response.data["errors"] == upload_job.errors
+
+
+def test_upload_job_status_hidden_from_other_users(api_client, upload_job):
+    api_client.force_login(UserFactory())
+    response = api_client.get(reverse("api:upload-job", kwargs={"job_id": upload_job.id}), {"format": "json"})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -1,7 +1,7 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import SampleAPIView, SampleUploadView
+from .views import SampleAPIView, SampleCursorAPIView, SampleTableAPIView, SampleUploadView, UploadJobStatusView
 
 router = routers.DefaultRouter()
 
@@ -12,6 +12,9 @@ app_name = "api"
 urlpatterns = [
     path("", include(router.urls)),
     path("sample/", SampleAPIView.as_view(), name="sample-list"),
+    path("sample/cursor/", SampleCursorAPIView.as_view(), name="sample-cursor"),
+    path("sample/table/", SampleTableAPIView.as_view(), name="sample-table"),
     path("upload/", SampleUploadView.as_view(), name="sample-upload"),
+    path("upload/<int:job_id>/", UploadJobStatusView.as_view(), name="upload-job"),
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
 ]
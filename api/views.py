@@ -1,62 +1,230 @@
 import json
+from itertools import islice
 
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
-from rest_framework import status
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.renderers import TemplateHTMLRenderer
+from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
 
-from .models import Sample
-from .serializers import SampleSerializer
-from .renderers import CSVRenderer
+from .compression import NEGOTIATED_FORMATS, compress_response, get_export_encoding
+from .exports import EXPORT_COLUMNS, get_export_schema, iter_export_batches
+from .models import Sample, SampleUploadReceipt, UploadJob, content_hash
+from .pagination import SampleCursorPagination
+from .serializers import SampleSerializer, SampleTableSerializer, UploadJobSerializer
+from .renderers import CSVRenderer, ParquetRenderer, XLSXRenderer, iter_csv, iter_parquet, iter_xlsx
+from .scopes import get_user_lab_ids, scope_to_user_labs, sees_all_labs
+from .services import ingest_samples
 
+# Number of samples read from the database and serialized at a time when streaming an export
+EXPORT_CHUNK_SIZE = 1000
 
-class SampleAPIView(LoginRequiredMixin, APIView):
-    login_url = "/accounts/login/"
-    renderer_classes = [TemplateHTMLRenderer, CSVRenderer]
+# Formats of SampleAPIView that are streamed as file downloads
+EXPORT_FORMATS = ("csv", "parquet", "xlsx")
 
-    def get(self, request):
-        if request.user.is_superuser or request.user.is_staff:
-            samples = Sample.objects.all()
-        else:
-            user_labs = request.user.groups.all().values_list("id", flat=True)
-            samples = Sample.objects.filter(submitting_lab__in=user_labs)
 
-        # Apply filters
+class SampleQuerysetMixin:
+    """
+    Samples visible to the user, filtered by the columnN query parameters of the sample table
+    """
+
+    def get_queryset(self):
+        return self.get_filtered_samples().select_related(
+            "submitting_lab", "bmh_project", "status_summary__latest_workflow_execution__workflow"
+        )
+
+    def get_filtered_samples(self):
+        request = self.request
+        samples = scope_to_user_labs(Sample.objects.all(), request.user)
+
+        # Apply filters, on PostgreSQL these substring searches use the trigram indexes created by
+        # sample_database migration 0001, elsewhere they scan the table
         filters = Q()
         filter_fields = ['sample_id', 'sample_name', 'tube_plate_label', 'submitting_lab__lab_name']
         for i, field in enumerate(filter_fields):
             filter_value = request.query_params.get(f'column{i}')
             if filter_value:
                 filters &= Q(**{f'{field}__icontains': filter_value})
-        
-        samples = samples.filter(filters)
 
-        serializer = SampleSerializer(samples, many=True)
-        return Response(serializer.data)
+        return samples.filter(filters)
+
+
+class SampleAPIView(LoginRequiredMixin, SampleQuerysetMixin, APIView):
+    login_url = "/accounts/login/"
+    renderer_classes = [TemplateHTMLRenderer, CSVRenderer, ParquetRenderer, XLSXRenderer]
+
+    def get(self, request):
+        export_format = request.accepted_renderer.format
+        encoding = get_export_encoding(request, export_format) if export_format in EXPORT_FORMATS else None
+
+        # polling clients that already have the current samples are answered without reading them
+        etag = self._get_etag(encoding)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            samples = self.get_queryset()
+            if export_format == "csv":
+                response = self._stream_csv(samples)
+            elif export_format in EXPORT_FORMATS:
+                response = self._stream_columnar(self.get_filtered_samples(), request.accepted_renderer)
+            else:
+                response = Response(SampleSerializer(samples, many=True).data)
+            if encoding:
+                response = compress_response(response, encoding)
+
+        if export_format in NEGOTIATED_FORMATS:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        response["ETag"] = etag
+        return response
+
+    def handle_exception(self, exc):
+        # the Parquet and XLSX renderers only negotiate the streamed exports, so their errors are sent as JSON
+        if isinstance(getattr(self.request, "accepted_renderer", None), (ParquetRenderer, XLSXRenderer)):
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def _get_etag(self, encoding):
+        # one aggregate over the samples: any added, removed or saved sample changes the count or the newest
+        # modified time, any aliquot or workflow execution change the newest activity of their status summaries,
+        # and any renamed lab or project the newest modified time of those. The lab scope, filters, format and
+        # compression change the response but not the samples, so they're part of the ETag as well. There is no
+        # Last-Modified, since a removed sample changes the response without making any of these times newer.
+        stats = self.get_filtered_samples().aggregate(
+            count=Count("id"),
+            last_modified=Max("modified"),
+            last_activity=Max("status_summary__last_activity"),
+            lab_modified=Max("submitting_lab__modified"),
+            project_modified=Max("bmh_project__modified"),
+        )
+
+        user = self.request.user
+        lab_scope = "all" if sees_all_labs(user) else sorted(get_user_lab_ids(user))
+        filters = sorted(self.request.query_params.lists())
+        validator = [self.request.accepted_renderer.format, encoding, lab_scope, filters, stats]
+        return quote_etag(content_hash([json.dumps(validator, cls=DjangoJSONEncoder).encode()]))
+
+    def _stream_csv(self, samples):
+        # rows are read and serialized a chunk at a time, so memory use doesn't grow with the export
+        def iter_rows():
+            iterator = samples.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            while chunk := list(islice(iterator, EXPORT_CHUNK_SIZE)):
+                yield from SampleSerializer(chunk, many=True).data
+
+        fieldnames = list(SampleSerializer().fields)
+        response = StreamingHttpResponse(iter_csv(iter_rows(), fieldnames), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="samples.csv"'
+        return response
+
+    def _stream_columnar(self, samples, renderer):
+        # typed columns are read straight from the database in batches, without the serializer
+        batches = iter_export_batches(samples, EXPORT_CHUNK_SIZE)
+        if renderer.format == "parquet":
+            content = iter_parquet(batches, get_export_schema())
+        else:
+            content = iter_xlsx(batches, [name for name, _ in EXPORT_COLUMNS])
+        response = StreamingHttpResponse(content, content_type=renderer.media_type)
+        response["Content-Disposition"] = f'attachment; filename="samples.{renderer.format}"'
+        return response
     
 
+class SampleCursorAPIView(LoginRequiredMixin, SampleQuerysetMixin, generics.ListAPIView):
+    """
+    All samples visible to the user, cursor paginated in the order they were created,
+    for clients that walk the whole table. Follow the next link until it is null.
+    """
+
+    login_url = "/accounts/login/"
+    serializer_class = SampleSerializer
+    pagination_class = SampleCursorPagination
+    filter_backends = []
+
+
+class SampleTableAPIView(LoginRequiredMixin, generics.ListAPIView):
+    """
+    Rows of the sample database table. Requested with ?format=datatables, the rows are
+    searched, ordered and paginated in the database according to the DataTables parameters.
+    """
+
+    login_url = "/accounts/login/"
+    serializer_class = SampleTableSerializer
+    # keeps pages stable when ordering by a column with repeated values
+    datatables_additional_order_by = "id"
+
+    def get_queryset(self):
+        samples = scope_to_user_labs(Sample.objects.all(), self.request.user)
+        return samples.select_related("submitting_lab", "bmh_project").order_by("-id")
+
+
 class SampleUploadView(LoginRequiredMixin, APIView):
     login_url = "/accounts/login/"
 
-    def post(self, request, data=None):
-        data = data if data else request.data
-        serializer = SampleSerializer(data=json.loads(data), many=True)
-        if serializer.is_valid():
-            sample_instances = serializer.save()  # could be one or more samples
+    def post(self, request):
+        data = request.data
+        dry_run = request.query_params.get("dry_run", "").lower() in ("1", "true")
 
-            if isinstance(sample_instances, list):
-                for sample_instance in sample_instances:
-                    sample_instance.save()
-            else:
-                sample_instances.save()
+        # answer a resubmission of data that was already uploaded without parsing it again
+        upload_hash = None
+        if not dry_run:
+            upload_hash = content_hash([data.encode() if isinstance(data, str) else json.dumps(data).encode()])
+            receipts = SampleUploadReceipt.objects.filter(content_hash=upload_hash)
+            # only the uploader and members of the labs it was uploaded for are answered from a receipt
+            if not sees_all_labs(request.user):
+                lab_ids = get_user_lab_ids(request.user)
+                receipts = receipts.filter(Q(user=request.user) | Q(submitting_lab__in=lab_ids))
+            receipt = receipts.first()
+            if receipt is not None:
+                return Response(receipt.response, status=status.HTTP_200_OK)
 
+        # the samples may be posted as a JSON array or as a string holding one
+        records = json.loads(data) if isinstance(data, str) else data
+        result = ingest_samples(records, None, None, request.user, dry_run=dry_run)
+        if not result.is_valid:
+            response_data = {"success": False, "errors": result.errors}
+            if dry_run:
+                response_data["dry_run"] = True
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        if dry_run:
             response_data = {
                 "success": True,
-                "message": "Sample uploaded successfully.",
+                "dry_run": True,
+                "message": "Samples validated successfully. No samples were saved.",
             }
-            return Response(response_data, status=status.HTTP_201_CREATED)
+            return Response(response_data, status=status.HTTP_200_OK)
+
+        response_data = {
+            "success": True,
+            "message": "Sample uploaded successfully.",
+        }
+        labs = {sample.submitting_lab for sample in result.samples}
+        SampleUploadReceipt.objects.bulk_create(
+            [
+                SampleUploadReceipt(
+                    user=request.user, submitting_lab=lab, content_hash=upload_hash, response=response_data
+                )
+                for lab in labs
+            ],
+            ignore_conflicts=True,
+        )
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+
+class UploadJobStatusView(LoginRequiredMixin, APIView):
+    login_url = "/accounts/login/"
+
+    def get(self, request, job_id):
+        if sees_all_labs(request.user):
+            jobs = UploadJob.objects.all()
         else:
-            response_data = {"success": False, "errors": serializer.errors}
-            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+            lab_ids = get_user_lab_ids(request.user)
+            jobs = UploadJob.objects.filter(Q(user=request.user) | Q(submitting_lab__in=lab_ids))
+
+        job = get_object_or_404(jobs.select_related("submitting_lab", "bmh_project"), pk=job_id)
+        serializer = UploadJobSerializer(job)
+        return Response(serializer.data)
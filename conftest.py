@@ -2,6 +2,7 @@ import json
 
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from rest_framework.test import APIClient
 
 from api.models import generate_sample_id
@@ -9,6 +10,11 @@ from api.tests.factories import LabFactory, ProjectFactory, SampleFactory
 from bmh_sample_tracker.users.tests.factories import UserFactory
 
 
+@pytest.fixture(autouse=True)
+def media_storage(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+
+
 @pytest.fixture
 def test_lab():
     lab = LabFactory()
@@ -159,3 +165,11 @@ def test_excel_full():
         },
     ]
     yield data
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # the cache outlives each test's database transaction, so don't let cached rows leak between tests
+    cache.clear()
+    yield
+    cache.clear()
@@ -1,31 +1,34 @@
 from django import forms
+from django.core.exceptions import ValidationError
 
 from api.models import Lab, Project
+from api.scopes import get_user_lab_ids, sees_all_labs
+
+from .readers import get_reader
 
 
 class UploadForm(forms.Form):
-    MAX_FILE_SIZE_MB = 10
+    MAX_FILE_SIZE_MB = 50
 
     lab = forms.ModelChoiceField(queryset=Lab.objects.none(), to_field_name="lab_name")
     bmh_project = forms.ModelChoiceField(
         queryset=Project.objects.none(), to_field_name="project_name", required=False, label="Existing Project"
     )
     submitter_project = forms.CharField(max_length=250, required=False, label="New Project")
-    excel_file = forms.FileField(label="Excel File")
+    excel_file = forms.FileField(label="Sample Sheet (.xlsx, .csv, .tsv or .parquet)")
+    dry_run = forms.BooleanField(required=False, label="Validate only (do not upload samples)")
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
         if user:
-            if user.is_staff:
+            if sees_all_labs(user):
                 self.fields["bmh_project"].queryset = Project.objects.all()
                 self.fields["lab"].queryset = Lab.objects.all()
             else:
-                user_group_names = user.groups.values_list("name", flat=True)
-                self.fields["bmh_project"].queryset = Project.objects.filter(
-                    supporting_lab__lab_name__in=user_group_names
-                )
-                self.fields["lab"].queryset = Lab.objects.filter(lab_name__in=user_group_names)
+                lab_ids = get_user_lab_ids(user)
+                self.fields["bmh_project"].queryset = Project.objects.filter(supporting_lab__in=lab_ids)
+                self.fields["lab"].queryset = Lab.objects.filter(id__in=lab_ids)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -54,10 +57,10 @@ class UploadForm(forms.Form):
             if file.size > max_file_size_bytes:
                 self.add_error("excel_file", f"File size exceeds the maximum limit of {self.MAX_FILE_SIZE_MB} MB.")
 
-            file_type = file.content_type
-            if file_type != "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
-                self.add_error(
-                    "excel_file", "Non-excel file uploaded. Currently, only excel (.xlsx) files are supported."
-                )
+            # the file extension picks the reader used to parse the sheet
+            try:
+                get_reader(file.name)
+            except ValidationError as e:
+                self.add_error("excel_file", e)
 
             return cleaned_data
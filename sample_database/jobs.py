@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import UploadJob
+from api.services import ingest_samples, validate_samples
+
+from .notifications import queue_notification
+from .readers import get_reader
+from .validation import DataCleanerValidator
+
+# Jobs being processed that haven't been updated for this long have lost their worker and are queued again.
+# Progress is saved after every validated chunk, but saving a large sheet happens in a single transaction.
+STALE_JOB_TIMEOUT = timedelta(hours=1)
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending upload job as being processed and return it, or None if there
+    are no pending jobs. Jobs locked by another worker are skipped, and jobs left behind by
+    a worker that stopped while processing them are queued again first.
+    """
+    with transaction.atomic():
+        UploadJob.objects.filter(
+            status__in=["VALIDATING", "SAVING"], modified__lt=timezone.now() - STALE_JOB_TIMEOUT
+        ).update(status="PENDING", rows_processed=0, modified=timezone.now())
+        job = (
+            UploadJob.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING")
+            .order_by("created", "id")
+            .first()
+        )
+        if job is not None:
+            _update_job(job, status="VALIDATING")
+    return job
+
+
+def run_upload_job(job):
+    """
+    Validate every row of the job's sample sheet and, if no errors were found, save all of
+    the samples in a single transaction. Progress is committed on the job after each chunk of
+    rows is validated so that it can be polled while the upload is running. Dry run jobs stop
+    after validation and never save anything.
+    """
+    samples_created = 0
+    try:
+        errors = _validate_sample_sheet(job)
+        if not errors and not job.dry_run:
+            _update_job(job, status="SAVING")
+            with transaction.atomic():
+                samples_created, errors = _save_sample_sheet(job)
+                if errors:
+                    transaction.set_rollback(True)
+    except ValidationError as e:
+        errors = [{"row": None, "field": None, "message": message} for message in e.messages]
+
+    if errors:
+        _update_job(job, status="FAILED", errors=errors)
+    else:
+        _update_job(job, status="COMPLETE", samples_created=samples_created)
+        if samples_created:
+            queue_notification(f"New sample data uploaded by {job.user.get_username()}.")
+    return job
+
+
+def fail_upload_job(job, message):
+    _update_job(job, status="FAILED", errors=[{"row": None, "field": None, "message": message}])
+
+
+def _update_job(job, **fields):
+    for field, value in fields.items():
+        setattr(job, field, value)
+    job.save(update_fields=[*fields, "modified"])
+
+
+def _iter_cleaned_chunks(job):
+    reader = get_reader(job.sample_sheet.name)
+    with job.sample_sheet.open("rb") as file:
+        for df in reader(file):
+            cleaner_validator = DataCleanerValidator(df)
+            cleaner_validator.validate()
+            cleaner_validator.clean()
+            duplicate_errors = cleaner_validator.remove_duplicate_sample_names()
+            yield cleaner_validator.df, duplicate_errors
+
+
+def _validate_sample_sheet(job):
+    # one context for the whole sheet, so lookups are cached and duplicates caught across chunks
+    context = {}
+    errors = []
+    for df, duplicate_errors in _iter_cleaned_chunks(job):
+        result = validate_samples(
+            df.to_dict(orient="records"), job.submitting_lab, job.bmh_project, job.submitter_project, context
+        )
+        row_errors = duplicate_errors + _get_row_errors(df, result.errors)
+        errors.extend(sorted(row_errors, key=lambda error: error["row"]))
+        _update_job(job, rows_processed=job.rows_processed + len(df) + len(duplicate_errors))
+    if not job.rows_processed:
+        # the readers never yield an empty chunk, so a sheet without data rows gives no chunks at all
+        errors.append({"row": None, "field": None, "message": "Empty file uploaded. No samples added."})
+    return errors
+
+
+def _save_sample_sheet(job):
+    context = {}
+    samples_created = 0
+    for df, _ in _iter_cleaned_chunks(job):
+        result = ingest_samples(
+            df.to_dict(orient="records"),
+            job.submitting_lab,
+            job.bmh_project,
+            job.user,
+            submitter_project=job.submitter_project,
+            context=context,
+        )
+        if not result.is_valid:
+            # the sheet was valid a moment ago, so a conflicting upload must have been saved since
+            return 0, _get_row_errors(df, result.errors)
+        samples_created += len(result.samples)
+    return samples_created, []
+
+
+def _get_row_errors(df, serializer_errors):
+    # report spreadsheet row numbers, accounting for the header row
+    return [
+        {"row": row + 2, "field": field, "message": str(message)}
+        for row, row_errors in zip(df.index, serializer_errors)
+        for field, messages in row_errors.items()
+        for message in messages
+    ]
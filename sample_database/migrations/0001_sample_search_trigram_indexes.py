@@ -0,0 +1,60 @@
+"""
+Trigram indexes for the substring searches of the sample table and sample API.
+
+Django turns ``__icontains`` into ``UPPER(column::text) LIKE UPPER('%value%')`` on
+PostgreSQL, so the indexes are built on that same expression with ``gin_trgm_ops``.
+The searches then use the indexes without any change to the queries, and other
+databases keep searching the way they always have.
+"""
+import pkgutil
+from importlib import import_module
+
+from django.db import migrations
+
+# (index name, table, column)
+TRIGRAM_INDEXES = [
+    ("sample_sample_id_trgm_idx", "api_sample", "sample_id"),
+    ("sample_sample_name_trgm_idx", "api_sample", "sample_name"),
+    ("sample_tube_plate_label_trgm_idx", "api_sample", "tube_plate_label"),
+    ("sample_genus_trgm_idx", "api_sample", "genus"),
+    ("sample_species_trgm_idx", "api_sample", "species"),
+    ("lab_lab_name_trgm_idx", "api_lab", "lab_name"),
+]
+
+
+def get_api_dependencies():
+    # the api tables are created by its migrations, but ("api", "__first__") can only be resolved
+    # once the api app has migration modules of its own, so it's left out while it has none
+    api_migrations = import_module("api.migrations")
+    names = [name for _, name, is_pkg in pkgutil.iter_modules(api_migrations.__path__) if not is_pkg]
+    if any(name[0] not in "_~" for name in names):
+        return [("api", "__first__")]
+    return []
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # the indexes are built concurrently so the sample table stays writable, which can't be done in a transaction
+    atomic = False
+
+    dependencies = get_api_dependencies()
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
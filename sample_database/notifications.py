@@ -0,0 +1,88 @@
+from collections import Counter
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import SlackNotification
+
+# Number of queued messages combined into a single Slack post
+BATCH_SIZE = 50
+
+# Notifications are given up on after this many failed posts
+MAX_ATTEMPTS = 5
+
+# Delay before the first retry, doubled after every failed attempt
+RETRY_DELAY = timedelta(seconds=30)
+
+# Claimed notifications are not picked up by another dispatcher until this long after being claimed
+CLAIM_TIMEOUT = timedelta(minutes=2)
+
+
+def queue_notification(message):
+    """
+    Queue a Slack message to be sent by the send_slack_notifications command.
+    Only writes to the database, so it is safe to call while handling a request.
+    """
+    return SlackNotification.objects.create(message=message)
+
+
+def send_notifications(batch_size=BATCH_SIZE):
+    """
+    Send a batch of due notifications as a single Slack post. Identical messages are
+    coalesced into one line with a count. Failed posts are retried with exponential
+    backoff until MAX_ATTEMPTS is reached. Returns the number of notifications sent,
+    or 0 if there were none due or the post failed.
+    """
+    notifications = _claim_due_notifications(batch_size)
+    if not notifications:
+        return 0
+
+    try:
+        response = requests.post(settings.SLACK_WEBHOOK_URL, json={"text": _coalesce(notifications)}, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        _record_failure(notifications, str(e))
+        return 0
+
+    SlackNotification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+        status="SENT", sent=timezone.now(), modified=timezone.now()
+    )
+    return len(notifications)
+
+
+def _claim_due_notifications(batch_size):
+    # the post is made outside of the transaction, so claim the batch by pushing back its next attempt
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            SlackNotification.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING", next_attempt__lte=now)
+            .order_by("next_attempt", "id")[:batch_size]
+        )
+        SlackNotification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+            next_attempt=now + CLAIM_TIMEOUT, modified=now
+        )
+    return notifications
+
+
+def _coalesce(notifications):
+    counts = Counter(notification.message for notification in notifications)
+    return "\n".join(message if count == 1 else f"{message} (x{count})" for message, count in counts.items())
+
+
+def _record_failure(notifications, error):
+    now = timezone.now()
+    for notification in notifications:
+        notification.attempts += 1
+        notification.last_error = error
+        notification.modified = now
+        if notification.attempts >= MAX_ATTEMPTS:
+            notification.status = "FAILED"
+        else:
+            notification.next_attempt = now + RETRY_DELAY * 2 ** (notification.attempts - 1)
+    SlackNotification.objects.bulk_update(
+        notifications, ["attempts", "last_error", "status", "next_attempt", "modified"]
+    )
@@ -0,0 +1,160 @@
+from itertools import islice, repeat
+from pathlib import Path
+from zipfile import BadZipFile
+
+import pandas as pd
+from django.core.exceptions import ValidationError
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Number of spreadsheet rows handed to the cleaner and serializer at a time
+CHUNK_SIZE = 1000
+
+DATE_COLUMNS = ["culture_date", "dna_extraction_date"]
+
+# Maps a file extension to a function that reads a file object as DataFrame chunks
+READERS = {}
+
+
+def register_reader(*extensions):
+    """
+    Register the decorated function as the reader for files with the given extensions.
+    Readers take a binary file object and a chunk size and yield DataFrames of at most
+    that many rows, indexed by row position and with missing values as None.
+    """
+
+    def decorator(reader):
+        for extension in extensions:
+            READERS[extension.lower()] = reader
+        return reader
+
+    return decorator
+
+
+def get_reader(file_name):
+    try:
+        return READERS[Path(file_name).suffix.lower()]
+    except KeyError:
+        raise ValidationError(
+            f"Unsupported file type. Supported file types are: {', '.join(sorted(READERS))}."
+        ) from None
+
+
+def convert_date(date):
+    if not date or date is None or date == "null":
+        return None
+    if isinstance(date, str) and len(date) == 10:
+        return date  # proper validation will be performed by serializer
+    try:
+        return date.date().isoformat()
+    except AttributeError:
+        return date
+
+
+@register_reader(".xlsx")
+def iter_excel_chunks(file, chunk_size=CHUNK_SIZE):
+    """
+    Read the first worksheet of an Excel file as DataFrames of at most ``chunk_size`` rows.
+    The workbook is opened in openpyxl's read-only mode, so only the current chunk of rows
+    is held in memory regardless of the size of the file. Values are kept as plain Python
+    objects with empty cells as None, and date columns are converted to ISO format strings.
+    Each chunk is indexed by its position in the sheet, counting from the first data row.
+    """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, BadZipFile, KeyError):
+        raise ValidationError("The uploaded file could not be read as an Excel file.") from None
+
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = _get_header(next(rows, ()))
+        data_rows = _get_data_rows(rows, len(header))
+        start = 0
+        while chunk := list(islice(data_rows, chunk_size)):
+            yield _prepare_dataframe(pd.DataFrame(chunk, columns=header, dtype=object), start)
+            start += len(chunk)
+    finally:
+        workbook.close()
+
+
+@register_reader(".csv")
+def iter_csv_chunks(file, chunk_size=CHUNK_SIZE, sep=","):
+    """
+    Read a CSV file as DataFrames of at most ``chunk_size`` rows. Every value is read as
+    text, leaving type conversion to the serializer, and empty cells become None.
+    """
+    try:
+        chunks = pd.read_csv(
+            file,
+            sep=sep,
+            dtype=str,
+            keep_default_na=False,
+            na_values=[""],
+            encoding="utf-8-sig",
+            chunksize=chunk_size,
+        )
+        start = 0
+        for df in chunks:
+            yield _prepare_dataframe(df, start)
+            start += len(df)
+    except pd.errors.EmptyDataError:
+        return
+    except (pd.errors.ParserError, UnicodeDecodeError):
+        raise ValidationError("The uploaded file could not be read as a delimited text file.") from None
+
+
+@register_reader(".tsv", ".txt")
+def iter_tsv_chunks(file, chunk_size=CHUNK_SIZE):
+    return iter_csv_chunks(file, chunk_size=chunk_size, sep="\t")
+
+
+@register_reader(".parquet")
+def iter_parquet_chunks(file, chunk_size=CHUNK_SIZE):
+    """
+    Read a Parquet file as DataFrames of at most ``chunk_size`` rows, one record batch at a time.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        parquet_file = pq.ParquetFile(file)
+        start = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            df = batch.to_pandas(integer_object_nulls=True, date_as_object=True)
+            yield _prepare_dataframe(df, start)
+            start += len(df)
+    except pa.ArrowException:
+        raise ValidationError("The uploaded file could not be read as a Parquet file.") from None
+
+
+def _get_header(row):
+    header = list(row)
+    while header and header[-1] is None:
+        header.pop()
+    return [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+
+
+def _get_data_rows(rows, width):
+    blank_rows = 0
+    for row in rows:
+        if any(value is not None for value in row[width:]):
+            raise ValidationError("Extra columns in data: found values in columns without a header")
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+
+        # blank rows are only kept when followed by more data, like pd.read_excel
+        if all(value is None for value in row):
+            blank_rows += 1
+            continue
+        yield from repeat((None,) * width, blank_rows)
+        blank_rows = 0
+        yield row
+
+
+def _prepare_dataframe(df, start):
+    df = df.astype(object)
+    df = df.where(df.notna(), None)
+    df.index = pd.RangeIndex(start, start + len(df))
+    for col in DATE_COLUMNS:
+        if col in df:
+            df[col] = df[col].map(convert_date)
+    return df
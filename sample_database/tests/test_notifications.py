@@ -0,0 +1,95 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.models import SlackNotification
+from sample_database import notifications
+from sample_database.notifications import queue_notification, send_notifications
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def slack_webhook(settings):
+    """A local stand-in for the Slack webhook that records the messages posted to it."""
+    webhook = type("Webhook", (), {"messages": [], "status_code": 200})()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            webhook.messages.append(json.loads(body)["text"])
+            self.send_response(webhook.status_code)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.SLACK_WEBHOOK_URL = f"http://127.0.0.1:{server.server_port}/"
+    yield webhook
+    server.shutdown()
+    server.server_close()
+
+
+def test_send_notifications_batches_and_coalesces(slack_webhook):
+    queue_notification("New sample data uploaded by alice.")
+    queue_notification("New sample data uploaded by bob.")
+    queue_notification("New sample data uploaded by alice.")
+
+    assert send_notifications() == 3
+
+    assert slack_webhook.messages == ["New sample data uploaded by alice. (x2)\nNew sample data uploaded by bob."]
+    assert set(SlackNotification.objects.values_list("status", flat=True)) == {"SENT"}
+    assert send_notifications() == 0
+
+
+def test_send_notifications_retries_with_backoff(slack_webhook):
+    slack_webhook.status_code = 500
+    notification = queue_notification("New sample data uploaded by alice.")
+
+    assert send_notifications() == 0
+
+    notification.refresh_from_db()
+    assert notification.status == "PENDING"
+    assert notification.attempts == 1
+    assert notification.next_attempt > timezone.now() + notifications.RETRY_DELAY - timedelta(seconds=5)
+    assert "500" in notification.last_error
+
+    # not due again until the retry delay has passed
+    assert send_notifications() == 0
+    assert len(slack_webhook.messages) == 1
+
+    slack_webhook.status_code = 200
+    SlackNotification.objects.update(next_attempt=timezone.now())
+    assert send_notifications() == 1
+    notification.refresh_from_db()
+    assert notification.status == "SENT"
+
+
+def test_send_notifications_gives_up_after_max_attempts(slack_webhook):
+    slack_webhook.status_code = 500
+    notification = queue_notification("New sample data uploaded by alice.")
+
+    for _ in range(notifications.MAX_ATTEMPTS):
+        SlackNotification.objects.update(next_attempt=timezone.now())
+        send_notifications()
+
+    notification.refresh_from_db()
+    assert notification.status == "FAILED"
+    assert notification.attempts == notifications.MAX_ATTEMPTS
+    assert len(slack_webhook.messages) == notifications.MAX_ATTEMPTS
+
+
+def test_send_slack_notifications_command(slack_webhook):
+    queue_notification("New sample data uploaded by alice.")
+
+    call_command("send_slack_notifications", "--once")
+
+    assert slack_webhook.messages == ["New sample data uploaded by alice."]
@@ -0,0 +1,103 @@
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+import pytest
+from django.core.exceptions import ValidationError
+from openpyxl import Workbook
+
+from sample_database.readers import (
+    get_reader,
+    iter_csv_chunks,
+    iter_excel_chunks,
+    iter_parquet_chunks,
+    iter_tsv_chunks,
+)
+
+
+def _make_excel(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    output = BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def test_iter_excel_chunks_splits_rows():
+    rows = [["sample_name", "well"]] + [[f"Sample{i}", "A01"] for i in range(5)]
+    chunks = list(iter_excel_chunks(_make_excel(rows), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert list(chunks[0].columns) == ["sample_name", "well"]
+    assert chunks[2].loc[4, "sample_name"] == "Sample4"
+
+
+def test_iter_excel_chunks_converts_dates_and_empty_cells():
+    rows = [
+        ["sample_name", "culture_date", "approx_genome_size_in_bp"],
+        ["Sample1", datetime(2021, 1, 1), 5000000],
+        ["Sample2", None, None],
+    ]
+    records = next(iter_excel_chunks(_make_excel(rows))).to_dict(orient="records")
+    assert records == [
+        {"sample_name": "Sample1", "culture_date": "2021-01-01", "approx_genome_size_in_bp": 5000000},
+        {"sample_name": "Sample2", "culture_date": None, "approx_genome_size_in_bp": None},
+    ]
+
+
+def test_iter_excel_chunks_drops_trailing_blank_rows():
+    rows = [["sample_name", "well"], ["Sample1", "A01"], [None, None], ["Sample2", "A02"], [None, None], [None]]
+    df = next(iter_excel_chunks(_make_excel(rows)))
+    assert df["sample_name"].tolist() == ["Sample1", None, "Sample2"]
+
+
+def test_iter_excel_chunks_rejects_values_without_header():
+    rows = [["sample_name", "well"], ["Sample1", "A01", "extra"]]
+    with pytest.raises(ValidationError):
+        list(iter_excel_chunks(_make_excel(rows)))
+
+
+def test_iter_excel_chunks_empty_file():
+    assert list(iter_excel_chunks(_make_excel([]))) == []
+
+
+def test_iter_csv_chunks_reads_text_with_none_for_empty_cells():
+    file = BytesIO("﻿sample_name,well,culture_date\nSample1,A01,2021-01-01\nSample2,,\n".encode())
+    chunks = list(iter_csv_chunks(file, chunk_size=1))
+    assert [chunk.index.tolist() for chunk in chunks] == [[0], [1]]
+    assert chunks[1].to_dict(orient="records") == [{"sample_name": "Sample2", "well": None, "culture_date": None}]
+
+
+def test_iter_tsv_chunks():
+    file = BytesIO(b"sample_name\twell\nSample1\tA01\n")
+    df = next(iter_tsv_chunks(file))
+    assert df.to_dict(orient="records") == [{"sample_name": "Sample1", "well": "A01"}]
+
+
+def test_iter_parquet_chunks():
+    source = pd.DataFrame(
+        {
+            "sample_name": ["Sample1", "Sample2", "Sample3"],
+            "approx_genome_size_in_bp": pd.array([5000000, None, 1], dtype="Int64"),
+            "culture_date": pd.to_datetime(["2021-01-01", None, "2021-01-03"]),
+        }
+    )
+    file = BytesIO()
+    source.to_parquet(file, index=False)
+    file.seek(0)
+
+    chunks = list(iter_parquet_chunks(file, chunk_size=2))
+    assert chunks[1].index.tolist() == [2]
+    assert chunks[0].to_dict(orient="records") == [
+        {"sample_name": "Sample1", "approx_genome_size_in_bp": 5000000, "culture_date": "2021-01-01"},
+        {"sample_name": "Sample2", "approx_genome_size_in_bp": None, "culture_date": None},
+    ]
+
+
+def test_get_reader():
+    assert get_reader("samples.XLSX") is iter_excel_chunks
+    assert get_reader("samples.csv") is iter_csv_chunks
+    with pytest.raises(ValidationError, match="Unsupported file type"):
+        get_reader("samples.json")
@@ -0,0 +1,75 @@
+import pytest
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.models import Aliquot, Batch, Workflow, WorkflowExecution
+from api.tests.factories import SampleFactory
+from bmh_sample_tracker.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def sample():
+    sample = SampleFactory()
+    batch = Batch.objects.create(batch_name="batch1")
+    workflow = Workflow.objects.create(workflow_name="DNA extraction")
+    for _ in range(3):
+        aliquot = Aliquot.objects.create(sample=sample, batch=batch)
+        WorkflowExecution.objects.create(aliquot=aliquot, workflow=workflow, status="COMPLETE")
+    return sample
+
+
+def _get_detail(client, sample):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(reverse("sample_database:detail", kwargs={"sample_id": sample.sample_id}))
+    return response, [query["sql"] for query in context.captured_queries]
+
+
+def test_sample_detail_view_is_rendered_from_one_query_plan(client, sample):
+    client.force_login(UserFactory(is_staff=True))
+
+    response, queries = _get_detail(client, sample)
+
+    assert response.status_code == 200
+    assert response.content.decode().count("DNA extraction") == 3
+    # the sample, then its aliquots with their batches, then their executions with their workflows
+    assert len([query for query in queries if '"api_' in query]) == 3
+
+    # a repeat view is answered from the cached page fragment
+    response, repeat_queries = _get_detail(client, sample)
+    assert response.content.decode().count("DNA extraction") == 3
+    assert len([query for query in repeat_queries if '"api_' in query]) == 1
+
+
+def test_sample_detail_view_cache_follows_changes(client, sample):
+    client.force_login(UserFactory(is_staff=True))
+    _get_detail(client, sample)
+
+    aliquot = Aliquot.objects.filter(sample=sample).first()
+    WorkflowExecution.objects.create(
+        aliquot=aliquot, workflow=Workflow.objects.create(workflow_name="Sequencing"), status="IN_PROGRESS"
+    )
+    response, _ = _get_detail(client, sample)
+    assert "Sequencing" in response.content.decode()
+
+    WorkflowExecution.objects.filter(workflow__workflow_name="Sequencing").delete()
+    response, _ = _get_detail(client, sample)
+    assert "Sequencing" not in response.content.decode()
+
+    sample.genus = "Salmonella"
+    sample.save()
+    response, _ = _get_detail(client, sample)
+    assert "Salmonella" in response.content.decode()
+
+
+def test_sample_detail_view_only_shows_samples_from_user_labs(client, sample, django_capture_on_commit_callbacks):
+    user = UserFactory()
+    client.force_login(user)
+    assert _get_detail(client, sample)[0].status_code == 404
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.groups.set([Group.objects.get(name=sample.submitting_lab.lab_name)])
+    assert _get_detail(client, sample)[0].status_code == 200
@@ -0,0 +1,35 @@
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.db.backends.postgresql.operations import DatabaseOperations
+
+trigram_migration = import_module("sample_database.migrations.0001_sample_search_trigram_indexes")
+
+
+class RecordingSchemaEditor:
+    def __init__(self, vendor="postgresql"):
+        self.connection = SimpleNamespace(vendor=vendor)
+        self.statements = []
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+
+def test_trigram_indexes_match_icontains_lookups():
+    schema_editor = RecordingSchemaEditor()
+    trigram_migration.create_trigram_indexes(None, schema_editor)
+
+    # the indexes are only used if they are built on the expression PostgreSQL searches with icontains
+    lookup = DatabaseOperations(connection=None).lookup_cast("icontains", "CharField")
+    assert schema_editor.statements[0] == "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+    for (name, table, column), sql in zip(trigram_migration.TRIGRAM_INDEXES, schema_editor.statements[1:]):
+        assert sql.startswith(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin")
+        assert f"({lookup % column} gin_trgm_ops)" in sql
+
+
+def test_trigram_indexes_are_skipped_on_other_databases():
+    schema_editor = RecordingSchemaEditor(vendor="sqlite")
+    trigram_migration.create_trigram_indexes(None, schema_editor)
+    trigram_migration.drop_trigram_indexes(None, schema_editor)
+
+    assert schema_editor.statements == []
@@ -113,3 +113,17 @@ def test_upload_form_large_file(user_with_group, large_mock_excel_file):
     form = UploadForm(data=form_data, files=form_files, user=user_with_group)
     assert not form.is_valid()
     assert f"File size exceeds the maximum limit of {UploadForm.MAX_FILE_SIZE_MB} MB." in form.errors["excel_file"]
+
+
+def test_upload_form_unsupported_file_type(user_with_group):
+    lab = Lab.objects.get(lab_name=user_with_group.groups.first().name)
+    project = ProjectFactory(supporting_lab=lab)
+    form_data = {
+        "lab": lab,
+        "bmh_project": project,
+        "submitter_project": "",
+    }
+    form_files = {"excel_file": SimpleUploadedFile("samples.json", b"[]", content_type="application/json")}
+    form = UploadForm(data=form_data, files=form_files, user=user_with_group)
+    assert not form.is_valid()
+    assert any("Unsupported file type" in error for error in form.errors["excel_file"])
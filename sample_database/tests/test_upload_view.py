@@ -0,0 +1,279 @@
+from datetime import timedelta
+from functools import partial
+from io import BytesIO
+
+import pandas as pd
+import pytest
+from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from api.models import Sample, SlackNotification, UploadJob
+from api.tests.factories import LabFactory, ProjectFactory
+from bmh_sample_tracker.users.tests.factories import UserFactory
+from sample_database import jobs, readers
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def lab_user():
+    lab = LabFactory()
+    user = UserFactory()
+    user.groups.set([Group.objects.get(name=lab.lab_name)])
+    return user, lab
+
+
+def _make_sample_sheet(sample_names):
+    df = pd.DataFrame(
+        {
+            "sample_name": sample_names,
+            "tube_plate_label": ["T1"] * len(sample_names),
+            "sample_type": ["Cells (in DNA/RNA shield)"] * len(sample_names),
+            "sample_volume_in_ul": [10] * len(sample_names),
+            "requested_services": ["Illumina WGS"] * len(sample_names),
+            "genus": ["Escherichia"] * len(sample_names),
+            "species": ["coli"] * len(sample_names),
+            "culture_date": pd.to_datetime(["2021-01-01"] * len(sample_names)),
+        }
+    )
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="SSS-Template", index=False)
+    return SimpleUploadedFile(
+        "sample_sheet.xlsx",
+        output.getvalue(),
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+def _post_sample_sheet(client, user, lab, sample_sheet, project=None):
+    project = project or ProjectFactory(supporting_lab=lab)
+    client.force_login(user)
+    return client.post(
+        reverse("sample_database:upload-form"),
+        {
+            "lab": lab.lab_name,
+            "bmh_project": project.project_name,
+            "submitter_project": "",
+            "excel_file": sample_sheet,
+        },
+    )
+
+
+def test_upload_form_view_queues_job(client, lab_user):
+    user, lab = lab_user
+    response = _post_sample_sheet(client, user, lab, _make_sample_sheet(["Sample0", "Sample1"]))
+
+    job = UploadJob.objects.get()
+    assert response.status_code == 302
+    assert response.url == reverse("sample_database:upload-status", kwargs={"job_id": job.id})
+    assert job.status == "PENDING"
+    assert job.user == user
+    assert not Sample.objects.exists()
+
+    response = client.get(response.url)
+    assert response.status_code == 200
+    assert response.context["job"] == job
+
+
+def test_process_upload_jobs_streams_chunks(client, lab_user, monkeypatch):
+    monkeypatch.setitem(readers.READERS, ".xlsx", partial(readers.iter_excel_chunks, chunk_size=2))
+    user, lab = lab_user
+    _post_sample_sheet(client, user, lab, _make_sample_sheet([f"Sample{i}" for i in range(5)]))
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.status == "COMPLETE"
+    assert job.rows_processed == 5
+    assert job.samples_created == 5
+    assert Sample.objects.filter(submitting_lab=lab).count() == 5
+    assert str(Sample.objects.get(sample_name="Sample0").culture_date) == "2021-01-01"
+    assert Sample.history.filter(history_user=user).count() == 5
+
+
+def test_process_upload_jobs_reports_every_row_error(client, lab_user, monkeypatch):
+    monkeypatch.setitem(readers.READERS, ".xlsx", partial(readers.iter_excel_chunks, chunk_size=2))
+    user, lab = lab_user
+    _post_sample_sheet(client, user, lab, _make_sample_sheet(["Sample0", "Sample 1", "Sample2", "Sample 3"]))
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.status == "FAILED"
+    assert job.rows_processed == 4
+    assert [(error["row"], error["field"]) for error in job.errors] == [(3, "sample_name"), (5, "sample_name")]
+    assert not Sample.objects.exists()
+
+
+def test_process_upload_jobs_reports_duplicate_names_with_other_row_errors(client, lab_user):
+    user, lab = lab_user
+    _post_sample_sheet(client, user, lab, _make_sample_sheet(["A_1", "A_1", "bad name", "B_1"]))
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.status == "FAILED"
+    assert [(error["row"], error["field"]) for error in job.errors] == [(3, "sample_name"), (4, "sample_name")]
+    assert "appears more than once in this file (first in row 2)" in job.errors[0]["message"]
+    assert not Sample.objects.exists()
+
+
+def test_process_upload_jobs_reports_file_errors(client, lab_user):
+    user, lab = lab_user
+    sample_sheet = SimpleUploadedFile(
+        "sample_sheet.xlsx",
+        b"not an excel file",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+    _post_sample_sheet(client, user, lab, sample_sheet)
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.status == "FAILED"
+    assert job.errors == [
+        {"row": None, "field": None, "message": "The uploaded file could not be read as an Excel file."}
+    ]
+
+
+def test_process_upload_jobs_dry_run(client, lab_user):
+    user, lab = lab_user
+    project = ProjectFactory(supporting_lab=lab)
+    client.force_login(user)
+    client.post(
+        reverse("sample_database:upload-form") + "?dry_run=1",
+        {
+            "lab": lab.lab_name,
+            "bmh_project": project.project_name,
+            "submitter_project": "",
+            "excel_file": _make_sample_sheet(["Sample0", "Sample1"]),
+        },
+    )
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.dry_run
+    assert job.status == "COMPLETE"
+    assert job.rows_processed == 2
+    assert job.samples_created == 0
+    assert not Sample.objects.exists()
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_process_upload_jobs_other_formats(client, lab_user, suffix):
+    user, lab = lab_user
+    df = pd.read_excel(_make_sample_sheet(["Sample0", "Sample1"]))
+    output = BytesIO()
+    if suffix == ".csv":
+        df.to_csv(output, index=False, date_format="%Y-%m-%d")
+    else:
+        df.to_parquet(output, index=False)
+    _post_sample_sheet(client, user, lab, SimpleUploadedFile(f"sample_sheet{suffix}", output.getvalue()))
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.status == "COMPLETE", job.errors
+    assert Sample.objects.filter(submitting_lab=lab).count() == 2
+    assert str(Sample.objects.get(sample_name="Sample0").culture_date) == "2021-01-01"
+
+
+def test_upload_form_view_answers_resubmitted_sheet_with_original_job(client, lab_user):
+    user, lab = lab_user
+    project = ProjectFactory(supporting_lab=lab)
+    sample_sheet = _make_sample_sheet(["Sample0", "Sample1"])
+    _post_sample_sheet(client, user, lab, sample_sheet, project)
+    call_command("process_upload_jobs", "--once")
+    job = UploadJob.objects.get()
+
+    # another member of the lab submits the same sheet again
+    other_user = UserFactory()
+    other_user.groups.set(user.groups.all())
+    sample_sheet.seek(0)
+    response = _post_sample_sheet(client, other_user, lab, sample_sheet, project)
+
+    assert response.status_code == 302
+    assert response.url == reverse("sample_database:upload-status", kwargs={"job_id": job.id})
+    assert UploadJob.objects.count() == 1
+    assert client.get(response.url).context["job"] == job
+
+
+def test_upload_form_view_processes_resubmitted_sheet_after_failure(client, lab_user):
+    user, lab = lab_user
+    sample_sheet = _make_sample_sheet(["Sample0", "Sample1"])
+    _post_sample_sheet(client, user, lab, sample_sheet)
+    UploadJob.objects.update(status="FAILED")
+
+    sample_sheet.seek(0)
+    _post_sample_sheet(client, user, lab, sample_sheet)
+
+    assert UploadJob.objects.count() == 2
+    assert UploadJob.objects.filter(status="PENDING").count() == 1
+
+
+def test_upload_form_view_processes_resubmitted_sheet_for_another_project(client, lab_user):
+    user, lab = lab_user
+    sample_sheet = _make_sample_sheet(["Sample0", "Sample1"])
+    _post_sample_sheet(client, user, lab, sample_sheet)
+
+    sample_sheet.seek(0)
+    _post_sample_sheet(client, user, lab, sample_sheet, ProjectFactory(supporting_lab=lab))
+
+    assert UploadJob.objects.count() == 2
+    assert UploadJob.objects.filter(status="PENDING").count() == 2
+
+
+def test_process_upload_jobs_requeues_jobs_of_stopped_workers(client, lab_user):
+    user, lab = lab_user
+    _post_sample_sheet(client, user, lab, _make_sample_sheet(["Sample0", "Sample1"]))
+    # a worker claimed the job and was killed while validating it
+    UploadJob.objects.update(status="VALIDATING", rows_processed=1, modified=timezone.now() - timedelta(hours=2))
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.status == "COMPLETE"
+    assert job.rows_processed == 2
+    assert Sample.objects.count() == 2
+
+
+def test_claim_next_job_leaves_running_jobs_alone(client, lab_user):
+    user, lab = lab_user
+    _post_sample_sheet(client, user, lab, _make_sample_sheet(["Sample0"]))
+    UploadJob.objects.update(status="SAVING")
+
+    assert jobs.claim_next_job() is None
+    assert UploadJob.objects.get().status == "SAVING"
+
+
+def test_process_upload_jobs_queues_slack_notification(client, lab_user, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Slack should not be called while processing an upload")
+
+    monkeypatch.setattr("requests.post", fail)
+    user, lab = lab_user
+    _post_sample_sheet(client, user, lab, _make_sample_sheet(["Sample0", "Sample1"]))
+
+    call_command("process_upload_jobs", "--once")
+
+    assert UploadJob.objects.get().status == "COMPLETE"
+    notification = SlackNotification.objects.get()
+    assert notification.status == "PENDING"
+    assert notification.message == f"New sample data uploaded by {user.get_username()}."
+
+
+def test_process_upload_jobs_fails_sheet_without_data_rows(client, lab_user):
+    user, lab = lab_user
+    _post_sample_sheet(client, user, lab, _make_sample_sheet([]))
+
+    call_command("process_upload_jobs", "--once")
+
+    job = UploadJob.objects.get()
+    assert job.status == "FAILED"
+    assert job.errors == [{"row": None, "field": None, "message": "Empty file uploaded. No samples added."}]
+    assert not SlackNotification.objects.exists()
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from sample_database.validation import DataCleanerValidator
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def sample_df():
+    return pd.DataFrame(
+        {
+            "sample_name": ["Sample1", "Sample2 ", "Sample2", "test_donotuse", "test_donotuse"],
+            "sample_type": ["DNA"] * 5,
+            "tube_plate_label": ["T1", "T2", "T3", "T4", "T5"],
+            "sample_volume_in_ul": [10, 20, 30, 40, 50],
+            "requested_services": ["Illumina WGS"] * 5,
+            "genus": ["Escherichia"] * 5,
+            "species": ["coli"] * 5,
+        }
+    )
+
+
+def test_remove_duplicate_sample_names_keeps_the_first_row(sample_df):
+    cleaner_validator = DataCleanerValidator(sample_df)
+    cleaner_validator.validate()
+    cleaner_validator.clean()
+
+    errors = cleaner_validator.remove_duplicate_sample_names()
+
+    assert [(error["row"], error["field"]) for error in errors] == [(4, "sample_name")]
+    assert errors[0]["message"] == "Sample name 'Sample2' appears more than once in this file (first in row 3)."
+    assert cleaner_validator.df["sample_name"].tolist() == ["Sample1", "Sample2"]
+
+
+def test_remove_duplicate_sample_names_ignores_test_rows(sample_df):
+    sample_df.loc[2, "sample_name"] = "Sample3"
+    cleaner_validator = DataCleanerValidator(sample_df)
+    cleaner_validator.clean()
+
+    assert cleaner_validator.remove_duplicate_sample_names() == []
+    assert len(cleaner_validator.df) == 3
+
+
+def test_clean_strips_whitespace_and_converts_sample_type(sample_df):
+    sample_df["sample_name"] = [" Sample1", "Sample2 ", 3, "test_donotuse", None]
+    sample_df["genus"] = ["  Escherichia  ", "   ", "", None, "coli"]
+    sample_df["sample_type"] = ["Cells (in DNA/RNA shield)", "DNA", "RNA", "DNA", "Unknown"]
+    cleaner_validator = DataCleanerValidator(sample_df)
+    cleaner_validator.clean()
+    df = cleaner_validator.df
+
+    assert df["sample_name"].tolist() == ["Sample1", "Sample2", "3", None]
+    assert df["genus"].tolist() == ["Escherichia", "   ", "", "coli"]
+    assert df["sample_type"].tolist()[:3] == ["CELLS", "DNA", "RNA"]
+    assert pd.isna(df["sample_type"].tolist()[3])
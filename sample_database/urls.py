@@ -1,10 +1,11 @@
 from django.urls import path
 
-from .views import SampleDetailView, SampleListView, SampleUploadFormView
+from .views import SampleDetailView, SampleListView, SampleUploadFormView, UploadJobDetailView
 
 app_name = "sample_database"
 urlpatterns = [
     path("", SampleListView.as_view(), name="sample-db"),
     path("upload/", SampleUploadFormView.as_view(), name="upload-form"),
+    path("upload/<int:job_id>/", UploadJobDetailView.as_view(), name="upload-status"),
     path("<str:sample_id>/", SampleDetailView.as_view(), name="detail"),
 ]
@@ -1,8 +1,24 @@
+from functools import cache
+
+import numpy as np
+import pandas as pd
 from django.core.exceptions import ValidationError
 
 from api.models import SAMPLE_TYPE_CHOICES, Sample
 
 
+def duplicate_sample_name_error(row, sample_name, first_row):
+    """
+    The error reported for a row that repeats the sample name of an earlier row of the same
+    file. The first row with the name is kept, every later one is reported with this error.
+    """
+    return {
+        "row": row,
+        "field": "sample_name",
+        "message": f"Sample name '{sample_name}' appears more than once in this file (first in row {first_row}).",
+    }
+
+
 class DataCleanerValidator:
     REQUIRED_COLUMNS = [
         "sample_name",
@@ -23,23 +39,16 @@ class DataCleanerValidator:
         "species",
         "strain",
         "isolate",
-        "genus",
-        "species",
         "subspecies_subtype_lineage",
         "comments",
         "culture_conditions",
         "dna_extraction_method",
     ]
 
-    def __init__(self, df, bmh_project_name, submitter_project_name, lab_name):
-        n_records = df.shape[0]
-        if n_records == 0:
-            raise ValidationError("Empty file uploaded. No samples added.")
+    SAMPLE_TYPE_MAPPING = {value: key for key, value in SAMPLE_TYPE_CHOICES}
 
+    def __init__(self, df):
         self.df = df
-        self.bmh_project = bmh_project_name
-        self.submitter_project = submitter_project_name
-        self.submitting_lab = lab_name
 
     def validate(self):
         self._validate_required_columns()
@@ -51,14 +60,6 @@ class DataCleanerValidator:
         self._convert_sample_type()
         self._remove_test_data()
 
-    def get_dataframe(self):
-        final_df = self.df
-        final_df["bmh_project"] = self.bmh_project.project_name if self.bmh_project else ""
-        final_df["submitter_project"] = self.submitter_project
-        final_df["submitting_lab"] = self.submitting_lab.lab_name
-
-        return final_df
-
     def _validate_required_columns(self):
         missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in self.df.columns]
         if missing_columns:
@@ -68,31 +69,67 @@ class DataCleanerValidator:
         # right now this is done at the model level only
         pass
 
+    @staticmethod
+    @cache
+    def _get_model_fields():
+        # built once per process, the model schema does not change at runtime
+        return frozenset(f.name for f in Sample._meta.get_fields())
+
     def _no_extra_columns(self):
-        df = self.df
-        model_fields = [f.name for f in Sample._meta.get_fields()]
-        extra_columns = [col for col in df.columns if col not in model_fields]
+        model_fields = self._get_model_fields()
+        extra_columns = [col for col in self.df.columns if col not in model_fields]
 
         if extra_columns:
             raise ValidationError(f"Extra columns in data: {extra_columns}")
 
+    def remove_duplicate_sample_names(self):
+        """
+        Remove the rows that repeat the sample name of an earlier row in the DataFrame and
+        return an error for each of them, so the first row with each name and the rest of
+        the rows can still be validated. Call after ``clean`` so names that only differ in
+        surrounding whitespace are caught.
+        """
+        sample_names = self.df["sample_name"].astype("string")
+        # sheets loaded by the upload_samples command list a lab per row, names only need to be unique per lab
+        subset = ["submitting_lab", "sample_name"] if "submitting_lab" in self.df else ["sample_name"]
+        keyed = self.df.assign(sample_name=sample_names)
+        duplicated = keyed.duplicated(subset=subset) & sample_names.notna()
+        if not duplicated.any():
+            return []
+
+        # report spreadsheet row numbers, accounting for the header row
+        positions = pd.Series(self.df.index, index=self.df.index)
+        first_rows = positions.groupby([keyed[column] for column in subset], dropna=False).transform("first")
+        errors = [
+            duplicate_sample_name_error(row + 2, name, first_row + 2)
+            for row, name, first_row in zip(
+                self.df.index[duplicated], sample_names[duplicated], first_rows[duplicated]
+            )
+        ]
+        self.df = self.df[~duplicated]
+        return sorted(errors, key=lambda error: error["row"])
+
     def _strip_whitespace(self):
         for col in self.STRING_COLUMNS:
             if col in self.df:
-                processed_values = []
-                for item in self.df[col]:
-                    if item is not None and str(item).strip() != "":
-                        processed_values.append(str(item).strip())
-                    else:
-                        processed_values.append(item)
-                self.df[col] = processed_values
+                self.df[col] = self._strip_column(self.df[col])
+
+    @staticmethod
+    def _strip_column(values):
+        # sample sheets repeat most values, so strip each distinct value once and broadcast it back
+        codes, uniques = pd.factorize(values)
+        stripped = np.array([str(value).strip() or value for value in uniques] + [None], dtype=object)
+        result = stripped.take(codes)
+
+        # missing and whitespace-only values are left untouched
+        missing = codes == -1
+        result[missing] = values.to_numpy()[missing]
+        return pd.Series(result, index=values.index)
 
     def _convert_sample_type(self):
-        sample_type_mapping = {value: key for key, value in SAMPLE_TYPE_CHOICES}
-        self.df["sample_type"] = self.df["sample_type"].map(sample_type_mapping)
+        self.df["sample_type"] = self.df["sample_type"].map(self.SAMPLE_TYPE_MAPPING)
 
     def _remove_test_data(self):
-        if "test_donotuse" in self.df["sample_name"].values:
-            df = self.df
-            df = df[df["sample_name"] != "test_donotuse"]
-            self.df = df
+        is_test_data = self.df["sample_name"] == "test_donotuse"
+        if is_test_data.any():
+            self.df = self.df[~is_test_data]
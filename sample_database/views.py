@@ -1,25 +1,23 @@
-import json
-
-import numpy as np
-import pandas as pd
-import requests
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, Prefetch, Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.views.generic import ListView
+from django.views.generic import TemplateView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import FormView
 
-from api.models import Aliquot, Batch, Sample, WorkflowExecution
-from api.views import SampleUploadView
+from api.models import Aliquot, Sample, UploadJob, WorkflowExecution, content_hash
+from api.scopes import get_user_lab_ids, scope_to_user_labs, sees_all_labs
 
 from .forms import UploadForm
-from .validation import DataCleanerValidator
+
+# Seconds a rendered sample detail page is cached for. The cache key changes whenever the sample, its lab
+# or project, or one of its aliquots or workflow executions does; renamed batches and workflows show once
+# the cached page expires.
+SAMPLE_DETAIL_CACHE_TIMEOUT = 60 * 60 * 24
 
 
 def sample_management_view(request):
@@ -27,17 +25,9 @@ def sample_management_view(request):
 
 
 @method_decorator(ensure_csrf_cookie, name="dispatch")
-class SampleListView(LoginRequiredMixin, ListView):
-    model = Sample
+class SampleListView(LoginRequiredMixin, TemplateView):
+    # the rows are loaded page by page from api:sample-table
     template_name = "sample_database/sample_list.html"
-    context_object_name = "samples"
-
-    def get_queryset(self):
-        if self.request.user.is_superuser or self.request.user.is_staff:
-            return Sample.objects.all()
-        else:
-            user_labs = self.request.user.groups.all().values_list("id", flat=True)
-            return Sample.objects.filter(submitting_lab__in=user_labs)
 
 
 class SampleDetailView(LoginRequiredMixin, DetailView):
@@ -47,17 +37,47 @@ class SampleDetailView(LoginRequiredMixin, DetailView):
 
     def get_object(self):
         sample_id = self.kwargs["sample_id"]
-        return get_object_or_404(Sample, sample_id=sample_id)
+        # when and how many of the sample's aliquots and executions last changed, for the fragment cache version
+        samples = (
+            scope_to_user_labs(Sample.objects.all(), self.request.user)
+            .select_related("submitting_lab", "bmh_project")
+            .annotate(
+                aliquot_count=Count("aliquot", distinct=True),
+                aliquots_modified=Max("aliquot__modified"),
+                execution_count=Count("aliquot__workflowexecution", distinct=True),
+                executions_modified=Max("aliquot__workflowexecution__modified"),
+            )
+        )
+        return get_object_or_404(samples, sample_id=sample_id)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         sample = self.object
-        aliquots = Aliquot.objects.filter(sample=sample)
-        batches = Batch.objects.filter(aliquot__in=aliquots)
-        executions = WorkflowExecution.objects.filter(aliquot__in=aliquots)
-        context["aliquots"] = aliquots
-        context["batches"] = batches
-        context["executions"] = executions
+        # only evaluated when the cached page fragment is missing or out of date
+        context["aliquots"] = (
+            Aliquot.objects.filter(sample=sample)
+            .select_related("batch")
+            .prefetch_related(
+                Prefetch(
+                    "workflowexecution_set",
+                    queryset=WorkflowExecution.objects.select_related("workflow").order_by("modified", "id"),
+                )
+            )
+            .order_by("batch__created", "batch", "id")
+        )
+        context["fragment_timeout"] = SAMPLE_DETAIL_CACHE_TIMEOUT
+        context["fragment_version"] = ":".join(
+            str(value)
+            for value in (
+                sample.modified.timestamp(),
+                sample.submitting_lab.modified.timestamp(),
+                sample.bmh_project.modified.timestamp() if sample.bmh_project else None,
+                sample.aliquot_count,
+                sample.aliquots_modified.timestamp() if sample.aliquots_modified else None,
+                sample.execution_count,
+                sample.executions_modified.timestamp() if sample.executions_modified else None,
+            )
+        )
         return context
 
 
@@ -78,96 +98,57 @@ class SampleUploadFormView(LoginRequiredMixin, FormView):
         return super().form_invalid(form)
 
     def form_valid(self, form):
-        file = form.cleaned_data["excel_file"]
-        lab_name = form.cleaned_data["lab"]
-        bmh_project_name = form.cleaned_data["bmh_project"]
-        submitter_project_name = form.cleaned_data["submitter_project"]
-
-        df = (
-            pd.read_excel(
-                file,
-                dtype={"approx_genome_size_in_bp": "Int64"},
-                converters={
-                    "culture_date": self._date_converter,
-                    "dna_extraction_date": self._date_converter,
-                },
+        dry_run = form.cleaned_data["dry_run"] or self.request.GET.get("dry_run", "").lower() in ("1", "true")
+        sample_sheet = form.cleaned_data["excel_file"]
+        sheet_hash = content_hash(sample_sheet.chunks())
+
+        # a sheet the lab already uploaded to the same project is answered with the original job instead of
+        # being processed again
+        if not dry_run:
+            previous_job = (
+                UploadJob.objects.filter(
+                    submitting_lab=form.cleaned_data["lab"],
+                    bmh_project=form.cleaned_data["bmh_project"],
+                    submitter_project=form.cleaned_data["submitter_project"],
+                    content_hash=sheet_hash,
+                    dry_run=False,
+                )
+                .exclude(status="FAILED")
+                .order_by("-created")
+                .first()
             )
-            .fillna(np.nan)
-            .replace([np.nan], [None])
+            if previous_job is not None:
+                messages.info(self.request, "This sample sheet was already uploaded. Showing the original upload.")
+                return redirect(reverse("sample_database:upload-status", kwargs={"job_id": previous_job.id}))
+
+        job = UploadJob.objects.create(
+            user=self.request.user,
+            submitting_lab=form.cleaned_data["lab"],
+            bmh_project=form.cleaned_data["bmh_project"],
+            submitter_project=form.cleaned_data["submitter_project"],
+            sample_sheet=sample_sheet,
+            dry_run=dry_run,
+            content_hash=sheet_hash,
         )
+        if dry_run:
+            messages.success(self.request, "Sample sheet received. It will be validated shortly.")
+        else:
+            messages.success(self.request, "Sample sheet received. It will be validated and uploaded shortly.")
+        return redirect(reverse("sample_database:upload-status", kwargs={"job_id": job.id}))
+
 
-        cleaner_validator = DataCleanerValidator(df, bmh_project_name, submitter_project_name, lab_name)
-
-        try:
-            cleaner_validator.validate()
-        except ValidationError as e:
-            messages.error(self.request, str(e))
-            return redirect(reverse("sample_database:upload-form"))
-
-        cleaner_validator.clean()
-        df = cleaner_validator.get_dataframe()
-
-        data = df.to_dict(orient="records")
-        json_data = json.dumps(data)
-
-        view = SampleUploadView()
-        response = view.post(self.request, data=json_data)
-
-        # Handle the API response based on the status code
-        if response.status_code == 201:
-            messages.success(self.request, "Data uploaded successfully.")
-            slack_message = {"text": f"New sample data uploaded by {self.request.user.get_username()}."}
-            try:
-                slack_response = requests.post(settings.SLACK_WEBHOOK_URL, json=slack_message, timeout=10)
-
-                # Log the response details
-                print(f"Slack API Response Status Code: {slack_response.status_code}")
-                print(f"Slack API Response Content: {slack_response.text}")
-
-                # Check if the response indicates success
-                if slack_response.status_code != 200:
-                    print(f"Slack API returned non-200 status code: {slack_response.status_code}")
-                    print(f"Response content: {slack_response.text}")
-
-            except requests.RequestException as e:
-                print(f"Failed to send Slack notification: {e}")
-            except Exception as e:
-                print(f"Unexpected error when sending Slack notification: {e}")
-
-            return redirect(reverse("sample_database:sample-db"))
-        elif response.status_code == 400:
-            errors = response.data["errors"]
-            if isinstance(errors, list):
-                # If errors is a list of dictionaries
-                for error_dict in errors:
-                    for field, error_messages in error_dict.items():
-                        for error_message in error_messages:
-                            messages.error(self.request, f"Error in field {field}: {error_message}")
-                            return redirect(reverse("sample_database:upload-form"))
-            else:
-                # If errors is a dictionary
-                for field, error_messages in errors.items():
-                    for error_message in error_messages:
-                        messages.error(self.request, f"Error in field {field}: {error_message}")
-                        return redirect(reverse("sample_database:upload-form"))
-        elif response.status_code == 500:
-            error_message = response.data["errors"]
-            messages.error(self.request, f"Internal server error: {error_message}")
-            return redirect(reverse("sample_database:upload-form"))
-            # TODO: log this error somewhere
+class UploadJobDetailView(LoginRequiredMixin, DetailView):
+    model = UploadJob
+    template_name = "sample_database/upload_status.html"
+    context_object_name = "job"
+    login_url = "/accounts/login/"
+
+    def get_object(self):
+        if sees_all_labs(self.request.user):
+            jobs = UploadJob.objects.all()
         else:
-            # Handle other status codes if necessary
-            pass
-
-        # Redirect the user back to the form
-        return redirect(reverse("sample_database:upload-form"))
-
-    def _date_converter(self, date):
-        if not date or date is None or date == "null":
-            return None
-        if isinstance(date, str) and len(date) == 10:
-            return date  # proper validation will be performed by serializer
-        try:
-            return date.date().isoformat()
-        except AttributeError:
-            return date
+            # jobs are shared within a lab, resubmitted sheets are answered with another member's job
+            jobs = UploadJob.objects.filter(
+                Q(user=self.request.user) | Q(submitting_lab__in=get_user_lab_ids(self.request.user))
+            )
+        return get_object_or_404(jobs, pk=self.kwargs["job_id"])